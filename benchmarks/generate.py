@@ -0,0 +1,90 @@
+import os
+import json
+import random
+import subprocess
+
+# Theme layouts loosely modelled on the real store, a few stylesheets plus an optional asset folder
+tags = ['dark', 'light', 'minimal', 'compact', 'sidebar', 'tabs', 'rounded', 'colorful', 'glass', 'retro']
+words = ['clean', 'modern', 'sleek', 'cozy', 'vivid', 'soft', 'sharp', 'floating', 'native', 'pastel']
+
+def _git(*args, cwd=None):
+    subprocess.run(
+        ['git', '-c', 'user.name=bench', '-c', 'user.email=bench@localhost', *args],
+        cwd=cwd, check=True, capture_output=True
+    )
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def generate_theme(path, theme_id, rng: random.Random) -> dict:
+    files = ['chrome.css', 'content.css']
+    folders = []
+
+    _write(f'{path}/chrome.css', f'@import "parts/{theme_id}.css";\n#navigator-toolbox {{ background: url("icons/bg.png"); }}\n'.encode())
+    _write(f'{path}/content.css', b'@-moz-document url("about:home") { body { color: #333; } }\n')
+    _write(f'{path}/parts/{theme_id}.css', b'.tabbrowser-tab { border-radius: 8px; }\n' * rng.randint(5, 50))
+    folders.append('parts')
+
+    # Roughly a third of themes ship an icon pack
+    if rng.random() < 0.33:
+        for icon in range(rng.randint(5, 30)):
+            _write(f'{path}/icons/icon-{icon}.png', rng.randbytes(rng.randint(512, 8192)))
+    _write(f'{path}/icons/bg.png', rng.randbytes(2048))
+    folders.append('icons')
+
+    install_data = {
+        'files': files,
+        'folders': folders,
+        'uclChromeTarget': ['chrome.css'],
+        'uclContentTarget': ['content.css']
+    }
+    _write(f'{path}/theme.json', json.dumps(install_data, indent=4).encode())
+
+    return {
+        'name': f'{rng.choice(words).title()} {rng.choice(words).title()} {theme_id}',
+        'author': f'author{rng.randint(0, 200)}',
+        'authorUrl': 'https://example.com',
+        'homepage': 'https://example.com',
+        'version': f'1.{rng.randint(0, 9)}.{rng.randint(0, 9)}',
+        'createdAt': 1700000000 + rng.randint(0, 10 ** 7),
+        'updatedAt': 1710000000 + rng.randint(0, 10 ** 7),
+        'tags': rng.sample(tags, rng.randint(1, 4)),
+        'type': rng.randint(0, 2),
+        'description': ' '.join(rng.choice(words) for _ in range(rng.randint(5, 25)))
+    }
+
+def generate_repository(path, count, seed=0) -> str:
+    # Builds a source repository and a bare clone of it, returns a file:// URL for the bare one
+    rng = random.Random(seed)
+    source = f'{path}/source'
+    bare = f'{path}/source.git'
+
+    themes = {}
+    for number in range(count):
+        theme_id = f'theme-{number:05d}'
+        themes[theme_id] = generate_theme(f'{source}/themes/{theme_id}', theme_id, rng)
+
+    _write(f'{source}/themes.json', json.dumps(themes, indent=4).encode())
+
+    _git('init', '--quiet', source)
+    _git('add', '-A', cwd=source)
+    _git('commit', '--quiet', '-m', 'Generate catalog', cwd=source)
+    _git('clone', '--quiet', '--bare', source, bare)
+
+    return f'file://{os.path.abspath(bare)}'
+
+def generate_profiles(home, count=2) -> list:
+    # Fake Zen profile roots, matching what profiles._get_linux_path looks for
+    root = f'{home}/.zen/Profiles'
+    folders = []
+    for number in range(count):
+        folder = f'bench{number:03d}.Profile{number}'
+        os.makedirs(f'{root}/{folder}', exist_ok=True)
+        folders.append(folder)
+
+    with open(f'{root}/profiles.ini', 'w') as f:
+        f.write('[General]\n')
+
+    return folders
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Run as a script, so make the repository root importable
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate
+
+baselines_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+default_sizes = [100, 1000]
+default_threshold = 2.0
+# Timings this small are mostly noise, ignore regressions below this many seconds
+default_min_delta = 0.005
+
+def _timed(func, repeat=5, setup=None) -> float:
+    # Median wall time in seconds, setup runs untimed before every repetition
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    return statistics.median(samples)
+
+def run_child(size, workdir, repeat) -> dict:
+    # Runs inside a fresh interpreter whose HOME and WORKING_DIR point at the synthetic data
+    results = {}
+
+    start = time.perf_counter()
+    from zen_explorer_core import installer, profiles, repository
+    from zen_explorer_core.models.profile import Profile
+    results['import'] = time.perf_counter() - start
+
+    with open(f'{workdir}/source.url') as f:
+        source_url = f.read()
+
+    start = time.perf_counter()
+    repository.update_repository(source_url)
+    results['update_repository.clone'] = time.perf_counter() - start
+    results['update_repository.pull'] = _timed(lambda: repository.update_repository(), repeat=repeat)
+
+    repository_path = repository.repository_path()
+    with open(f'{repository_path}/themes.json') as f:
+        themes = json.load(f)
+
+    def load_all(repository_data):
+        for zen_theme in repository_data.themes.values():
+            zen_theme.files
+
+    results['RepositoryData.lazy'] = _timed(lambda: repository.RepositoryData(repository_path, themes), repeat=repeat)
+    results['RepositoryData.lazy_all'] = _timed(
+        lambda: load_all(repository.RepositoryData(repository_path, themes)), repeat=repeat
+    )
+    results['RepositoryData.snapshot'] = _timed(lambda: repository.get_repository(refresh=True), repeat=repeat)
+    results['RepositoryData.search'] = _timed(
+        lambda: repository.get_repository().search('sleek dark'), repeat=repeat
+    )
+
+    results['get_profiles.cold'] = _timed(lambda: profiles.get_profiles(refresh=True), repeat=repeat)
+    results['get_profiles.cached'] = _timed(lambda: profiles.get_profiles(), repeat=repeat)
+
+    zen_profile: Profile = profiles.get_profiles()[0]
+    theme_ids = sorted(themes)[:20]
+
+    def clean_profile():
+        shutil.rmtree(f'{zen_profile.path}/chrome', ignore_errors=True)
+
+    results['install_theme'] = _timed(
+        lambda: installer.install_theme(zen_profile, theme_ids[0]), repeat=repeat, setup=clean_profile
+    )
+    results['install_theme.unchanged'] = _timed(
+        lambda: installer.install_theme(zen_profile, theme_ids[0]), repeat=repeat
+    )
+    results['install_themes.20'] = _timed(
+        lambda: installer.install_themes(zen_profile, theme_ids), repeat=repeat, setup=clean_profile
+    )
+    results['uninstall_theme'] = _timed(
+        lambda: installer.uninstall_theme(zen_profile, theme_ids[0]), repeat=repeat,
+        setup=lambda: installer.install_theme(zen_profile, theme_ids[0])
+    )
+
+    installer.install_themes(zen_profile, theme_ids)
+    manifest = installer._read_manifest(zen_profile.path)
+    results['_build_css'] = _timed(lambda: installer._build_css(manifest), repeat=repeat)
+    results['_apply_css'] = _timed(lambda: installer._apply_css(zen_profile.path, manifest), repeat=repeat)
+    results['get_updates'] = _timed(lambda: installer.get_updates(zen_profile), repeat=repeat)
+    results['check_updates_all'] = _timed(lambda: installer.check_updates_all(), repeat=repeat)
+
+    return results
+
+def run_size(size, repeat, profile_count, keep=False) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f'zen-explorer-bench-{size}-')
+    try:
+        source_url = generate.generate_repository(f'{workdir}/repository', size)
+        with open(f'{workdir}/source.url', 'w') as f:
+            f.write(source_url)
+        generate.generate_profiles(f'{workdir}/home', profile_count)
+
+        env = dict(os.environ, HOME=f'{workdir}/home', WORKING_DIR=f'{workdir}/data')
+        os.makedirs(env['WORKING_DIR'])
+
+        # Each size runs in its own interpreter so import costs and module caches start cold
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', str(size), workdir, '--repeat', str(repeat)],
+            env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f'benchmark for {size} themes failed:\n{result.stderr}')
+        results = json.loads(result.stdout.strip().splitlines()[-1])
+
+        # A whole CLI process against the same data, so imports cli.py pulls in before dispatching count too.
+        # Started from here rather than the child, forking a process that holds the loaded catalog costs more than
+        # the command.
+        results['cli.help'] = _timed(
+            lambda: subprocess.run([sys.executable, f'{root_dir}/cli.py', 'help'], env=env, capture_output=True,
+                                   check=True),
+            repeat=repeat
+        )
+
+        return results
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def load_baselines() -> dict:
+    try:
+        with open(baselines_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'threshold': default_threshold, 'min_delta': default_min_delta, 'thresholds': {}, 'min_deltas': {},
+                'budgets': {}, 'results': {}}
+
+def compare(results, baselines) -> list:
+    # Returns (size, benchmark, limit, current) for every benchmark slower than baseline * threshold or its budget
+    regressions = []
+    min_delta = baselines.get('min_delta', default_min_delta)
+    for size, benchmarks in results.items():
+        size_baselines = baselines['results'].get(size, {})
+        for name, current in benchmarks.items():
+            baseline = size_baselines.get(name)
+            threshold = baselines.get('thresholds', {}).get(name, baselines.get('threshold', default_threshold))
+            # Benchmarks that mostly create files swing with the disk, they get a larger allowance
+            delta = baselines.get('min_deltas', {}).get(name, min_delta)
+            if baseline and current > baseline * threshold and current - baseline > delta:
+                regressions.append((size, name, baseline * threshold, current))
+
+            # Budgets are absolute limits in seconds, independent of the machine the baselines came from
+            budget = baselines.get('budgets', {}).get(name)
+            if budget and current > budget:
+                regressions.append((size, name, budget, current))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the zen-explorer core against synthetic catalogs.')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in default_sizes),
+                        help='comma separated catalog sizes, e.g. 100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--profiles', type=int, default=2)
+    parser.add_argument('--update-baselines', action='store_true', help='store these results as the new baselines')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--keep', action='store_true', help='keep the generated data')
+    parser.add_argument('--child', nargs=2, metavar=('SIZE', 'WORKDIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(int(args.child[0]), args.child[1], args.repeat)))
+        return
+
+    results = {}
+    for size in [int(size) for size in args.sizes.split(',')]:
+        print(f'Benchmarking {size} themes...', file=sys.stderr)
+        results[str(size)] = run_size(size, args.repeat, args.profiles, keep=args.keep)
+
+    baselines = load_baselines()
+    for size, benchmarks in results.items():
+        print(f'\n{size} themes')
+        for name, current in benchmarks.items():
+            baseline = baselines['results'].get(size, {}).get(name)
+            relative = f' ({current / baseline:.2f}x baseline)' if baseline else ''
+            print(f'  {name:<28} {current * 1000:10.2f} ms{relative}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if args.update_baselines:
+        baselines['results'].update(results)
+        with open(baselines_path, 'w') as f:
+            json.dump(baselines, f, indent=4)
+        print('\nBaselines updated.')
+        return
+
+    regressions = compare(results, baselines)
+    for size, name, limit, current in regressions:
+        print(f'REGRESSION: {name} with {size} themes took {current * 1000:.2f} ms, limit {limit * 1000:.2f} ms')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
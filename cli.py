@@ -1,8 +1,8 @@
 import sys
-from zen_explorer_core import profiles, repository, installer
-from zen_explorer_core.models import theme
-
-zen_profiles = profiles.get_profiles()
+import json
+# Only the daemon client is imported up front, commands import the rest of the core themselves so that
+# handing a command to a running daemon stays cheap
+from zen_explorer_core import daemon, timing
 
 class PrintableError(Exception):
     pass
@@ -15,7 +15,12 @@ class MissingArgumentsError(PrintableError):
         return f'Missing argument: {self.message}'
 
 def get_profiles(_args):
-    global zen_profiles
+    from zen_explorer_core import profiles
+    try:
+        zen_profiles = profiles.get_profiles()
+    except NotADirectoryError:
+        zen_profiles = []
+
     if not zen_profiles:
         print('No profiles available.')
         return
@@ -23,103 +28,327 @@ def get_profiles(_args):
     print('\nAvailable profiles:')
 
     for profile in zen_profiles:
-        profile_id, profile_name = profile.split('.', 1)
-        print(f'{profile_name} ({profile_id})')
+        print(f'{profile.name} ({profile.id})')
 
 def update_repository(args):
+    # Usage: [repo] [--full] [--sparse] | --mirror <url>
+    from zen_explorer_core import installer, repository, sources
+    positional = _positional(args)
+    shallow = '--full' not in args
+    sparse_themes = None
+    if '--sparse' in args:
+        try:
+            sparse_themes = sorted(installer.installed_themes())
+        except NotADirectoryError:
+            sparse_themes = []
+    mirror = _option(args, '--mirror')
+
     print('Updating repository...')
 
     try:
-        if len(args) > 0:
-            repository.update_repository(args[0])
+        if mirror:
+            changed = repository.update_repository(source=sources.HttpMirrorSource(mirror))
+        elif len(positional) > 0:
+            changed = repository.update_repository(positional[0], shallow=shallow, sparse_themes=sparse_themes)
         else:
-            repository.update_repository()
+            changed = repository.update_repository(shallow=shallow, sparse_themes=sparse_themes)
     except:
         print('Failed to update repository.')
         raise
 
     print('Repository updated.')
+    if len(changed) <= 20:
+        for zen_theme in sorted(changed):
+            print(f'Changed: {zen_theme}')
+    else:
+        print(f'{len(changed)} themes changed.')
 
 def themes(args):
+    from zen_explorer_core import repository
+    from zen_explorer_core.models import theme
     page = 0
     if len(args) > 0:
         try:
             page = int(args[0])
         except Exception:
             pass
-    if not repository.data or not repository.data.themes:
+    repository_data = repository.get_repository()
+    if not repository_data or not repository_data.themes:
         print('No themes available.')
         return
 
-    maxpage = len(repository.data.themes) // 20
+    maxpage = len(repository_data.themes) // 20
     if page > maxpage:
         page = maxpage
 
     print('\nAvailable themes')
-    theme_names = list(repository.data.themes.keys())
+    theme_names = list(repository_data.themes.keys())
     for x in range(page * 20, min((page + 1) * 20, len(theme_names))):
         if x >= len(theme_names):
             break
-        zen_theme: theme.Theme = repository.data.get_theme(theme_names[x])
+        zen_theme: theme.Theme = repository_data.get_theme(theme_names[x])
         print(f'({zen_theme.type_name} - {theme_names[x]}) {zen_theme.name} by {zen_theme.author}')
 
     print(f'\nPage {page + 1} of {maxpage + 1}')
 
-def install(args):
+# Options that consume the argument after them
+value_options = ['--jobs', '--mirror', '--interval']
+
+def search(args):
+    from zen_explorer_core import repository
+    from zen_explorer_core.models import theme
+    query = ' '.join(_positional(args))
+    if not query:
+        raise MissingArgumentsError('query')
+
+    repository_data = repository.get_repository()
+    if not repository_data or not repository_data.themes:
+        print('No themes available.')
+        return
+
+    results = repository_data.search(query, limit=20)
+    if not results:
+        print('No themes found.')
+        return
+
+    print(f'\nThemes matching "{query}"')
+    for theme_id in results:
+        zen_theme: theme.Theme = repository_data.get_theme(theme_id)
+        print(f'({zen_theme.type_name} - {theme_id}) {zen_theme.name} by {zen_theme.author}')
+
+def _positional(args) -> list:
+    positional = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in value_options:
+            skip = True
+        elif not arg.startswith('--'):
+            positional.append(arg)
+
+    return positional
+
+def _option(args, option, default=None):
     try:
-        zen_theme = args[0]
-    except IndexError:
+        return args[args.index(option) + 1]
+    except (ValueError, IndexError):
+        return default
+
+def _split_themes_and_profile(args) -> tuple:
+    # Usage: <theme> [<theme> ...] <profile> [options]
+    positional = _positional(args)
+    if len(positional) < 1:
         raise MissingArgumentsError('zen_theme')
-    try:
-        profile = args[1]
-    except IndexError:
+    if len(positional) < 2:
         raise MissingArgumentsError('profile')
 
+    return positional[:-1], positional[-1]
+
+def print_plan(plan, as_json=False):
+    # Shown for --staging, --json prints the serialized plan instead
+    if as_json:
+        print(json.dumps(plan.to_dict()))
+        return
+
+    print(f'\nPlan for {plan.profile.name} ({plan.profile.id}):')
+    if plan.empty:
+        print('Nothing to do.')
+        return
+
+    manifest_diff = plan.manifest_diff
+    for theme_id in manifest_diff['added']:
+        print(f'+ {theme_id} ({plan.manifest_after[theme_id].get("version")})')
+    for theme_id in manifest_diff['updated']:
+        print(f'~ {theme_id} ({plan.manifest_before[theme_id].get("version")} -> '
+              f'{plan.manifest_after[theme_id].get("version")})')
+    for theme_id in manifest_diff['removed']:
+        print(f'- {theme_id}')
+    for theme_id in dict.fromkeys(operation.theme_id for operation in plan.operations):
+        if theme_id in plan.manifest_before and theme_id not in manifest_diff['updated'] + manifest_diff['removed']:
+            print(f'~ {theme_id} (files changed)')
+
+    if plan.source:
+        print(f'{plan.count("copy")} files to copy, {plan.count("update")} to update, '
+              f'{plan.count("delete")} to delete, {timing.format_size(plan.bytes)} to write')
+    else:
+        print(f'{plan.count("remove")} theme folders to remove, {timing.format_size(plan.bytes)} to free')
+
+    for file, changes in plan.css_diff.items():
+        if changes['added'] or changes['removed']:
+            print(f'{file}: {len(changes["added"])} imports added, {len(changes["removed"])} removed')
+
+def install(args):
+    from zen_explorer_core import installer, repository
+    all_profiles = '--all-profiles' in args
+    if all_profiles:
+        # Usage: <theme> [<theme> ...] --all-profiles [--jobs N]
+        zen_themes, profile = _positional(args), None
+        if not zen_themes:
+            raise MissingArgumentsError('zen_theme')
+    else:
+        zen_themes, profile = _split_themes_and_profile(args)
+
+    try:
+        jobs = int(_option(args, '--jobs', 0)) or None
+    except ValueError:
+        raise MissingArgumentsError('--jobs <number>')
+
     staging = '--staging' in args # or True # TODO: debug, remove the "or True"
     bypass_install = '--bypass-install' in args
+    compare = 'hash' if '--hash' in args else 'mtime'
+    if '--link' in args:
+        method = 'link'
+    elif '--reflink' in args:
+        method = 'reflink'
+    elif '--store' in args:
+        method = 'store'
+    else:
+        method = 'copy'
 
-    if not repository.data or not repository.data.themes:
+    repository_data = repository.get_repository()
+    if not repository_data or not repository_data.themes:
         print('No themes available.')
         return
 
-    theme_data = repository.data.get_theme(zen_theme)
-    if not theme_data:
-        print('Theme not found.')
+    for zen_theme in zen_themes:
+        theme_data = repository_data.get_theme(zen_theme)
+        if not theme_data:
+            print(f'Theme not found: {zen_theme}')
+            return
+        try:
+            theme_data.files
+        except FileNotFoundError:
+            # Sparse checkouts only contain the themes that were installed when they were made
+            print(f'Theme files not found: {zen_theme}, run update without --sparse to fetch every theme.')
+            return
+
+        print(f'Installing {theme_data.name} by {theme_data.author}...')
+
+    if all_profiles and staging:
+        try:
+            plans = installer.plan_profiles(zen_themes, bypass_install=bypass_install, compare=compare)
+        except:
+            print('Failed to plan install.')
+            raise
+
+        for profile, plan in plans.items():
+            if isinstance(plan, Exception):
+                print(f'Cannot install into {profile}: {plan}')
+            else:
+                print_plan(plan, as_json='--json' in args)
+        return
+
+    if all_profiles:
+        try:
+            results = installer.install_themes_to_profiles(
+                zen_themes, jobs=jobs, bypass_install=bypass_install, staging=staging, compare=compare, method=method
+            )
+        except:
+            print('Failed to install themes.')
+            raise
+
+        failed = {profile: error for profile, error in results.items() if isinstance(error, Exception)}
+        for profile, error in failed.items():
+            print(f'Failed to install into {profile}: {error}')
+        print(f'Installed into {len(results) - len(failed)} of {len(results)} profiles.')
         return
 
-    print(f'Installing {theme_data.name} by {theme_data.author}...')
     try:
-        installer.install_theme(profile, zen_theme, bypass_install=bypass_install, staging=staging)
+        plan = installer.install_themes(
+            profile, zen_themes, bypass_install=bypass_install, staging=staging, compare=compare, method=method
+        )
     except:
-        print('Failed to install theme.')
+        print('Failed to install themes.' if len(zen_themes) > 1 else 'Failed to install theme.')
         raise
-    print('Theme installed.')
+
+    if staging:
+        print_plan(plan, as_json='--json' in args)
+        return
+    print('Themes installed.' if len(zen_themes) > 1 else 'Theme installed.')
 
 def uninstall(args):
+    from zen_explorer_core import installer
+    zen_themes, profile = _split_themes_and_profile(args)
+
+    staging = '--staging' in args # or True # TODO: debug, remove the "or True"
+
+    print('Uninstalling themes...' if len(zen_themes) > 1 else 'Uninstalling theme...')
     try:
-        zen_theme = args[0]
-    except IndexError:
-        raise MissingArgumentsError('zen_theme')
+        plan = installer.uninstall_themes(profile, zen_themes, staging=staging)
+    except:
+        print('Failed to uninstall themes.' if len(zen_themes) > 1 else 'Failed to uninstall theme.')
+        raise
+
+    if staging:
+        print_plan(plan, as_json='--json' in args)
+        return
+    print('Themes uninstalled.' if len(zen_themes) > 1 else 'Theme uninstalled.')
+
+def upgrade_all_profiles(args):
+    # Usage: --all-profiles [--yes] [--jobs N] [--staging [--json]]
+    from zen_explorer_core import installer
+    assume_yes = '--yes' in args
+    staging = '--staging' in args
     try:
-        profile = args[1]
-    except IndexError:
-        raise MissingArgumentsError('profile')
+        jobs = int(_option(args, '--jobs', 0)) or None
+    except ValueError:
+        raise MissingArgumentsError('--jobs <number>')
 
-    staging = '--staging' in args # or True # TODO: debug, remove the "or True"
+    print('Checking for updates...')
 
-    print('Uninstalling theme...')
     try:
-        installer.uninstall_theme(profile, zen_theme, staging=staging)
+        report = installer.check_updates_all()
     except:
-        print('Failed to uninstall theme.')
+        print('Failed to check for updates.')
         raise
-    print('Theme uninstalled.')
+
+    for profile, error in report.errors.items():
+        print(f'Failed to check {profile}: {error}')
+
+    if not report.updates:
+        print(f'No updates available in {report.checked} profiles.')
+        return
+
+    print('Available updates:')
+    for profile, theme_updates in report.updates.items():
+        for update in theme_updates:
+            print(f'{profile}: {update.theme_id} ({update.installed_version} -> {update.available_version})')
+
+    if not assume_yes:
+        choice = input(f'\nUpdate {report.count} themes across {len(report.updates)} profiles? (Y/n): ')
+        if choice.lower() != 'y':
+            return
+
+    print('Updating themes...')
+    results = installer.apply_updates(report, jobs=jobs, staging=staging)
+
+    if staging:
+        for profile, plan in results.items():
+            if isinstance(plan, Exception):
+                print(f'Cannot update {profile}: {plan}')
+            else:
+                print_plan(plan, as_json='--json' in args)
+        return
+
+    failed = {profile: error for profile, error in results.items() if isinstance(error, Exception)}
+    for profile, error in failed.items():
+        print(f'Failed to update {profile}: {error}')
+    print(f'Updated {len(results) - len(failed)} of {len(results)} profiles.')
 
 def upgrade(args):
+    from zen_explorer_core import installer
+    if '--all-profiles' in args:
+        upgrade_all_profiles(args)
+        return
+
+    # Usage: <profile> [<theme> ...], only the listed themes are upgraded if any are given
+    positional = _positional(args)
     try:
-        profile = args[0]
+        profile = positional[0]
     except IndexError:
         raise MissingArgumentsError('profile')
+    only_themes = positional[1:]
 
     print('Checking for updates...')
 
@@ -129,6 +358,9 @@ def upgrade(args):
         print('Failed to check for updates.')
         raise
 
+    if only_themes:
+        updates = {zen_theme: updates[zen_theme] for zen_theme in updates if zen_theme in only_themes}
+
     if not updates:
         print('No updates available.')
         return
@@ -142,19 +374,127 @@ def upgrade(args):
         return
 
     print('Updating themes...')
-    for zen_theme in updates:
-        try:
-            installer.install_theme(profile, zen_theme, bypass_install=True)
-        except:
-            print(f'Failed to update {updates[zen_theme].name}.')
-            raise
+    try:
+        installer.install_themes(profile, list(updates), bypass_install=True)
+    except:
+        print('Failed to update themes.')
+        raise
 
     print('Themes updated.')
 
+def bundle(args):
+    # Usage: <profile> [--minify] [--off]
+    from zen_explorer_core import installer
+    positional = _positional(args)
+    try:
+        profile = positional[0]
+    except IndexError:
+        raise MissingArgumentsError('profile')
+
+    enabled = '--off' not in args
+    try:
+        installer.set_bundle(profile, enabled=enabled, minify='--minify' in args)
+    except:
+        print('Failed to update CSS mode.')
+        raise
+
+    print('Theme CSS bundled.' if enabled else 'Theme CSS bundling turned off.')
+
+def export_mirror(args):
+    # Usage: <output folder>
+    from zen_explorer_core import sources
+    positional = _positional(args)
+    try:
+        output = positional[0]
+    except IndexError:
+        raise MissingArgumentsError('output')
+
+    print('Exporting mirror...')
+    try:
+        checksums = sources.export_mirror(output)
+    except:
+        print('Failed to export mirror.')
+        raise
+
+    print(f'Exported {len(checksums["themes"])} themes to {output}.')
+
+def _print_report(report, name):
+    for theme_id, theme_issues in report.issues.items():
+        for label, paths in (('missing', theme_issues.missing), ('extra', theme_issues.extra), ('modified', theme_issues.modified)):
+            for path in paths:
+                print(f'{name}: {theme_id}/{path} ({label})')
+    for theme_id in report.outdated:
+        print(f'{name}: {theme_id} is outdated, run upgrade to update it')
+
+    if report.ok:
+        print(f'{name}: {report.checked} themes OK.')
+    else:
+        print(f'{name}: {sum(theme_issues.count for theme_issues in report.issues.values())} problems in {len(report.issues)} of {report.checked} themes.')
+
+def verify_installs(args):
+    # Usage: [<profile>|--all-profiles] [--repair] [--jobs N], the repository clone is checked when no profile is given
+    from zen_explorer_core import verify
+    try:
+        jobs = int(_option(args, '--jobs', 0)) or None
+    except ValueError:
+        raise MissingArgumentsError('--jobs <number>')
+
+    positional = _positional(args)
+    print('Verifying files...')
+    try:
+        if '--all-profiles' in args:
+            reports = verify.verify_profiles(jobs=jobs)
+        elif positional:
+            reports = {positional[0]: verify.verify_profile(positional[0], jobs=jobs)}
+        else:
+            reports = {'repository': verify.verify_repository(jobs=jobs)}
+    except:
+        print('Failed to verify files.')
+        raise
+
+    for name, report in reports.items():
+        if isinstance(report, Exception):
+            print(f'Failed to verify {name}: {report}')
+            continue
+
+        _print_report(report, name)
+        if '--repair' in args and not report.ok:
+            try:
+                fixed = verify.repair(report)
+            except:
+                print(f'Failed to repair {name}.')
+                raise
+            print(f'{name}: repaired {fixed} files.')
+
+def run_daemon(args):
+    # Usage: [--interval SECONDS] | --stop
+    from zen_explorer_core import server
+    if '--stop' in args:
+        print('Daemon stopped.' if daemon.stop() else 'Daemon is not running.')
+        return
+
+    try:
+        interval = float(_option(args, '--interval', 2))
+    except ValueError:
+        raise MissingArgumentsError('--interval <seconds>')
+
+    if daemon.running():
+        print('Daemon is already running.')
+        return
+
+    print(f'Daemon listening on {daemon.socket_path()}')
+    try:
+        server.Daemon(lambda command_args: run_command(command_args[0], command_args[1:]), interval=interval).serve()
+    except KeyboardInterrupt:
+        pass
+    print('Daemon stopped.')
+
 def cli_help(_args):
     print('Zen Explorer CLI Help')
     for command in command_mappings:
         print(f'{command} - {command_mappings[command].get("description", "no description")}')
+    print('\nAdd --timings (or --timings=json) to any command to print how long each phase took.')
+    print('Commands are sent to the daemon when one is running, add --no-daemon to run them here instead.')
 
 def main():
     args = list(sys.argv)
@@ -167,6 +507,37 @@ def main():
 
     command_args = args[1:]
 
+    # --timings prints a per-phase breakdown to stderr, --timings=json prints JSON lines instead
+    timings = None
+    for arg in list(command_args):
+        if arg in ('--timings', '--timings=text', '--timings=json'):
+            timings = 'json' if arg == '--timings=json' else 'text'
+            timing.enable(timings)
+            command_args.remove(arg)
+
+    use_daemon = '--no-daemon' not in command_args
+    if not use_daemon:
+        command_args.remove('--no-daemon')
+
+    # Interactive commands need this terminal and the daemon command needs this process, they always run here.
+    # 'local' is either a flag or a check on the arguments, for commands that only prompt sometimes.
+    local = command_mappings.get(command, {}).get('local', False)
+    if callable(local):
+        local = local(command_args)
+
+    if use_daemon and not local:
+        response = daemon.request([command, *command_args], timings=timings)
+        if response is not None:
+            sys.stdout.write(response['stdout'])
+            sys.stderr.write(response['stderr'])
+            if response['error']:
+                sys.stderr.write(response['error'])
+                sys.exit(1)
+            return
+
+    run_command(command, command_args)
+
+def run_command(command, command_args):
     if command in command_mappings.keys():
         try:
             command_mappings[command]['func'](command_args)
@@ -186,24 +557,46 @@ command_mappings = {
         'func': get_profiles
     },
     'update': {
-        'description': 'Updates themes repository.',
+        'description': 'Updates themes repository. Usage: update [repo] [--full] [--sparse] | update --mirror <url>',
         'func': update_repository
     },
+    'export-mirror': {
+        'description': 'Writes the repository as a static mirror for update --mirror. Usage: export-mirror <folder>',
+        'func': export_mirror
+    },
     'themes': {
         'description': 'Lists available themes.',
         'func': themes
     },
+    'search': {
+        'description': 'Searches themes by name, author, description and tags. Usage: search <query>',
+        'func': search
+    },
     'install': {
-        'description': 'Installs a theme.',
+        'description': 'Installs one or more themes. Usage: install <theme> [<theme> ...] <profile>|--all-profiles [--jobs N] [--staging [--json]]',
         'func': install
     },
     'uninstall': {
-        'description': 'Uninstalls a theme.',
+        'description': 'Uninstalls one or more themes. Usage: uninstall <theme> [<theme> ...] <profile> [--staging [--json]]',
         'func': uninstall
     },
+    'bundle': {
+        'description': 'Bundles installed theme CSS into one file for faster startup. Usage: bundle <profile> [--minify] [--off]',
+        'func': bundle
+    },
+    'verify': {
+        'description': 'Checks installed files against the repository. Usage: verify [<profile>|--all-profiles] [--repair] [--jobs N]',
+        'func': verify_installs
+    },
     'upgrade': {
-        'description': 'Updates installed themes.',
-        'func': upgrade
+        'description': 'Updates installed themes. Usage: upgrade <profile> [<theme> ...] | upgrade --all-profiles [--yes] [--jobs N] [--staging [--json]]',
+        'func': upgrade,
+        'local': lambda args: not ('--all-profiles' in args and '--yes' in args)
+    },
+    'daemon': {
+        'description': 'Keeps the catalog loaded and answers commands over a local socket. Usage: daemon [--interval SECONDS] | daemon --stop',
+        'func': run_daemon,
+        'local': True
     }
 }
 
@@ -1,22 +1,23 @@
 import customtkinter as tk
-import requests
-import time
 import sys
-from cli import repository
+from zen_explorer_core import repository
 from zen_explorer_core.repository import update_repository
+from thumbnails import Dispatcher, ScaledImageCache, ThumbnailService
+from theme_grid import VirtualGrid
 from PIL import Image
-from io import BytesIO
 
-repo = repository.data
+repo = repository.get_repository()
 
 # Check if repository is available
 if repo is None:
     print("WARNING: Repository data could not be loaded. Some features may not be available.", file=sys.stderr)
     print("Use the 'update' command to fetch the repository data.", file=sys.stderr)
 
-images = []
-allow_resize_on = time.time()
-resize_delay = 0.05
+cards = {}
+theme_ids = []
+theme_grid = None
+resize_job = None
+resize_delay = 100
 
 # Root
 root = tk.CTk()
@@ -34,35 +35,75 @@ main_content.configure(fg_color="white")
 main_content.pack(side="right", fill="both", expand=True)
 max_col = 3
 
-def get_image(url):
-    response = requests.get(url)
-    img_data = response.content
-
-    # Open image
-    img = Image.open(BytesIO(img_data))
-
-    # Set a maximum height
-    max_height = 150
-    # Calculate the new width maintaining the aspect ratio
-    aspect_ratio = img.width / img.height
-    new_height = max_height
-    new_width = int(aspect_ratio * new_height)
-
-    # Resize image
-    resized = img.resize((new_width, new_height))
-    return resized
+# Thumbnails load in the background, cards show a placeholder until theirs arrives
+thumbnail_url = 'https://raw.githubusercontent.com/greeeen-dev/natsumi-browser/refs/heads/main/images/home.png'
+dispatcher = Dispatcher(root)
+thumbnails = ThumbnailService(dispatcher)
+placeholder = Image.new('RGB', (267, 150), '#cccccc')
 
 def to_ctkimage(image, size=None):
     # Convert PIL image to CTkImage
     return tk.CTkImage(image, size=size or (image.width, image.height))
 
+# Scaled images are shared by width bucket, so resizing reuses them instead of resampling every card
+scaled_images = ScaledImageCache(dispatcher, to_ctkimage)
+
+def scale_thumbnail(item):
+    width = theme_grid.card_width if theme_grid else 1
+    if width <= 1:
+        # Not laid out yet, keep the image's own size
+        return
+
+    def apply(ctkimage, image=item['img']):
+        # Skip results for an image that has since been replaced
+        if item['img'] is image and item['obj'].winfo_exists():
+            item['obj'].configure(image=ctkimage)
+
+    scaled_images.request(item['img'], width, apply)
+
+def set_thumbnail(item, theme, image):
+    # The card may have been recycled for another theme while the thumbnail was loading
+    if image is None or item['theme'] != theme or not item['obj'].winfo_exists():
+        return
+
+    item['img'] = image
+    scale_thumbnail(item)
+
+def create_card(parent):
+    # Main frame
+    theme_frame = tk.CTkFrame(parent)
+    theme_frame.configure(fg_color='transparent', corner_radius=0)
+
+    # Thumbnail (PLEASE LET THIS FUCKING WORK)
+    theme_thumbnail = tk.CTkLabel(theme_frame, text="", image=to_ctkimage(placeholder))
+    theme_thumbnail.pack(fill="both", expand=True)
+
+    # Theme name
+    theme_label = tk.CTkLabel(theme_frame, text="")
+    theme_label.pack()
+
+    cards[theme_frame] = {'obj': theme_thumbnail, 'img': placeholder, 'frame': theme_frame, 'label': theme_label, 'theme': None}
+    return theme_frame
+
+def bind_card(theme_frame, index):
+    item = cards[theme_frame]
+    theme = theme_ids[index]
+    theme_data = repo.get_theme(theme)
+
+    item['theme'] = theme
+    item['img'] = placeholder
+    item['label'].configure(text=theme_data.name)
+    scale_thumbnail(item)
+    thumbnails.request(thumbnail_url, lambda image, item=item, theme=theme: set_thumbnail(item, theme, image))
+
 def update_main():
+    global theme_grid
+
     # Reset main content
-    global allow_resize_on
     for child in main_content.winfo_children():
         child.destroy()
-    images = []
-    allow_resize_on = time.time()
+    cards.clear()
+    theme_grid = None
 
     # If repository is not available, show a message in the main content
     if repo is None:
@@ -74,61 +115,36 @@ def update_main():
         no_repo_label.pack(pady=50)
         return
 
-    row = 0
-    col = 0
-
-    thumbnail = get_image('https://raw.githubusercontent.com/greeeen-dev/natsumi-browser/refs/heads/main/images/home.png')
-
-    for theme in repo.themes:
-        theme_data = repo.get_theme(theme)
-
-        # Main frame
-        theme_frame = tk.CTkFrame(main_content)
-        theme_frame.configure(fg_color='transparent', corner_radius=0)
-        theme_frame.grid(row=row, column=col, padx=10, pady=10, sticky="ew")
+    # Cards are only created for rows near the viewport and recycled while scrolling
+    theme_ids[:] = list(repo.themes)
+    theme_grid = VirtualGrid(main_content, create_card, bind_card, columns=max_col, fg_color='white', corner_radius=0)
+    theme_grid.pack(fill="both", expand=True)
+    theme_grid.set_count(len(theme_ids))
 
-        # Thumbnail (PLEASE LET THIS FUCKING WORK)
-        theme_thumbnail = tk.CTkLabel(theme_frame, text="", image=to_ctkimage(thumbnail))
-        theme_thumbnail.pack(fill="both", expand=True)
-        images.append({'obj': theme_thumbnail, 'img': thumbnail, 'frame': theme_frame})
+def update_images():
+    global resize_job
+    resize_job = None
 
-        # Theme name
-        theme_label = tk.CTkLabel(theme_frame, text=theme_data.name)
-        theme_label.pack()
-
-        col += 1
-        if col >= max_col:
-            col = 0
-            row += 1
-
-def update_images(_):
-    global allow_resize_on
-
-    if time.time() < allow_resize_on:
+    if not theme_grid:
         return
 
-    allow_resize_on = time.time() + resize_delay
+    for theme_frame in theme_grid.visible_cards():
+        scale_thumbnail(cards[theme_frame])
 
-    for item in images:
-        widget = item['obj']
-        image = item['img']
-        parent = item['frame']
+def schedule_update_images(_):
+    # Debounce resizes, only the final size of a drag gets rescaled
+    global resize_job
 
-        if not type(widget) is tk.CTkLabel:
-            continue
-
-        new_width = parent.winfo_width()
-        aspect_ratio = image.width / image.height
-        new_height = int(new_width / aspect_ratio)
-
-        widget.configure(image=to_ctkimage(image, size=(new_width, new_height)))
+    if resize_job:
+        root.after_cancel(resize_job)
+    resize_job = root.after(resize_delay, update_images)
 
 
 update_main()
 
-for col in range(max_col):
-    main_content.grid_columnconfigure(col, weight=1, uniform="column")
-
 root.update()
-root.bind("<Configure>", update_images)
+root.bind("<Configure>", schedule_update_images)
 root.mainloop()
+thumbnails.close()
+scaled_images.close()
+dispatcher.close()
@@ -0,0 +1,143 @@
+import math
+import tkinter
+import customtkinter as tk
+
+def visible_range(top, height, row_height, count, columns, overscan=1) -> range:
+    # Indices of the items in or near the viewport, overscan adds extra rows above and below
+    if count <= 0 or row_height <= 0:
+        return range(0)
+
+    rows = math.ceil(count / columns)
+    first_row = max(0, int(top // row_height) - overscan)
+    last_row = min(rows - 1, int((top + height) // row_height) + overscan)
+
+    return range(first_row * columns, min(count, (last_row + 1) * columns))
+
+class VirtualGrid(tk.CTkFrame):
+    # Scrollable grid that only creates cards for visible rows and rebinds them as the user scrolls
+    def __init__(self, master, create_card, bind_card, columns=3, aspect_ratio=150 / 267, footer_height=40,
+                 padding=10, overscan=1, background='white', **kwargs):
+        super().__init__(master, **kwargs)
+        self._create_card = create_card
+        self._bind_card = bind_card
+        self._columns = columns
+        self._aspect_ratio = aspect_ratio
+        self._footer_height = footer_height
+        self._padding = padding
+        self._overscan = overscan
+
+        self._count = 0
+        self._visible = {}
+        self._free = []
+        self._layout = None
+        self._refreshing = False
+
+        self._scrollbar = tk.CTkScrollbar(self, command=self._scroll)
+        self._scrollbar.pack(side='right', fill='y')
+        self._canvas = tkinter.Canvas(
+            self, highlightthickness=0, borderwidth=0, background=background, yscrollincrement=20,
+            yscrollcommand=self._view_changed
+        )
+        self._canvas.pack(side='left', fill='both', expand=True)
+
+        self._canvas.bind('<Configure>', lambda _: self.refresh())
+        self.bind_all('<MouseWheel>', self._wheel, add='+')
+        self.bind_all('<Button-4>', self._wheel, add='+')
+        self.bind_all('<Button-5>', self._wheel, add='+')
+
+    @property
+    def card_width(self) -> int:
+        return max(1, self._canvas.winfo_width() // self._columns - 2 * self._padding)
+
+    @property
+    def row_height(self) -> int:
+        return int(self.card_width * self._aspect_ratio) + self._footer_height + 2 * self._padding
+
+    def visible_cards(self) -> list:
+        return [card for card, _ in self._visible.values()]
+
+    def set_count(self, count):
+        # Rebind everything, the data behind each index may have changed
+        self._count = count
+        for index in list(self._visible):
+            self._release(index)
+        self._canvas.yview_moveto(0)
+        self.refresh()
+
+    def _scroll(self, *args):
+        self._canvas.yview(*args)
+
+    def _view_changed(self, first, last):
+        self._scrollbar.set(first, last)
+        self.refresh()
+
+    def _wheel(self, event):
+        # Only scroll when the pointer is over this grid
+        widget = self.winfo_containing(event.x_root, event.y_root)
+        if widget is None or not (str(widget) == str(self) or str(widget).startswith(str(self) + '.')):
+            return
+
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        else:
+            steps = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+
+        self._canvas.yview_scroll(steps * 3, 'units')
+
+    def _release(self, index):
+        card, window = self._visible.pop(index)
+        self._canvas.itemconfigure(window, state='hidden')
+        self._free.append((card, window))
+
+    def refresh(self):
+        if self._refreshing:
+            return
+
+        width = self._canvas.winfo_width()
+        if width <= 1:
+            # Not laid out yet
+            return
+
+        self._refreshing = True
+        try:
+            card_width = self.card_width
+            row_height = self.row_height
+            column_width = width // self._columns
+
+            # Setting the scroll region calls back into _view_changed, only do it when it changes
+            layout = (width, row_height, self._count)
+            if layout != self._layout:
+                self._layout = layout
+                total_height = math.ceil(self._count / self._columns) * row_height
+                self._canvas.configure(scrollregion=(0, 0, width, total_height))
+
+            wanted = visible_range(
+                self._canvas.canvasy(0), self._canvas.winfo_height(), row_height,
+                self._count, self._columns, self._overscan
+            )
+
+            for index in list(self._visible):
+                if index not in wanted:
+                    self._release(index)
+
+            for index in wanted:
+                if index in self._visible:
+                    card, window = self._visible[index]
+                else:
+                    if self._free:
+                        card, window = self._free.pop()
+                    else:
+                        card = self._create_card(self._canvas)
+                        window = self._canvas.create_window(0, 0, window=card, anchor='nw')
+                    self._visible[index] = (card, window)
+                    self._bind_card(card, index)
+
+                row, column = divmod(index, self._columns)
+                self._canvas.coords(window, column * column_width + self._padding, row * row_height + self._padding)
+                self._canvas.itemconfigure(
+                    window, width=card_width, height=row_height - 2 * self._padding, state='normal'
+                )
+        finally:
+            self._refreshing = False
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+import platformdirs
+import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from zen_explorer_core import atomic
+
+cache_dir = os.path.join(platformdirs.user_cache_dir('zen-explorer'), 'thumbnails')
+
+class Dispatcher:
+    # Runs callbacks posted from worker threads on the Tk thread, Tk itself isn't thread-safe
+    def __init__(self, root, poll_interval=30):
+        self._root = root
+        self._poll_interval = poll_interval
+        self._queue = queue.Queue()
+        self._closed = False
+
+        self._root.after(self._poll_interval, self._poll)
+
+    def post(self, callback, *args):
+        self._queue.put((callback, args))
+
+    def _poll(self):
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            callback(*args)
+
+        if not self._closed:
+            self._root.after(self._poll_interval, self._poll)
+
+    def close(self):
+        self._closed = True
+
+class ThumbnailService:
+    # Fetches and decodes thumbnails off the Tk thread, callbacks are delivered through the dispatcher
+    def __init__(self, dispatcher: Dispatcher, workers=4, max_height=150, timeout=10,
+                 max_cache_bytes=100 * 1024 * 1024, revalidate_after=24 * 60 * 60, save_delay=2.0):
+        self._dispatcher = dispatcher
+        self._max_height = max_height
+        self._timeout = timeout
+        self._max_cache_bytes = max_cache_bytes
+        self._revalidate_after = revalidate_after
+        self._save_delay = save_delay
+
+        # One pooled session shared by every worker, so connections are reused
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+
+        self._lock = threading.Lock()
+        self._images = {}
+        self._pending = {}
+        self._save_timer = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+        self._total = sum(entry.get('size', 0) for entry in self._index.values())
+
+    @staticmethod
+    def _index_path():
+        return os.path.join(cache_dir, 'index.json')
+
+    @staticmethod
+    def _cache_path(key):
+        return os.path.join(cache_dir, key)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        atomic.write_json(self._index_path(), self._index)
+
+    def _schedule_save(self):
+        # Index writes are batched, a page of cache hits ends up as one write. Callers hold the lock.
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self._save_delay, self._flush_index)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush_index(self):
+        with self._lock:
+            self._save_timer = None
+            self._save_index()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache fits its size budget again
+        if self._total <= self._max_cache_bytes:
+            return
+
+        for key in sorted(self._index, key=lambda item: self._index[item].get('accessedAt', 0)):
+            if self._total <= self._max_cache_bytes:
+                break
+
+            self._total -= self._index[key].get('size', 0)
+            del self._index[key]
+            try:
+                os.remove(self._cache_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _read_cached(self, key):
+        try:
+            with open(self._cache_path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _download(self, url) -> bytes:
+        key = hashlib.sha256(url.encode()).hexdigest()
+
+        with self._lock:
+            entry = dict(self._index.get(key) or {})
+        cached = self._read_cached(key) if entry else None
+
+        if cached is not None and time.time() - entry.get('checkedAt', 0) < self._revalidate_after:
+            data = cached
+        else:
+            headers = {}
+            if cached is not None:
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+                if entry.get('lastModified'):
+                    headers['If-Modified-Since'] = entry['lastModified']
+
+            try:
+                response = self._session.get(url, headers=headers, timeout=self._timeout)
+            except requests.RequestException:
+                # Offline, a stale copy is better than nothing
+                if cached is None:
+                    raise
+                response = None
+
+            if response is None or response.status_code == 304:
+                data = cached
+            else:
+                response.raise_for_status()
+                data = response.content
+
+                atomic.write(self._cache_path(key), data)
+
+                entry = {
+                    'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'lastModified': response.headers.get('Last-Modified'),
+                    'size': len(data)
+                }
+
+            if response is not None:
+                entry['checkedAt'] = time.time()
+
+        entry['accessedAt'] = time.time()
+        with self._lock:
+            self._total += entry.get('size', 0) - (self._index.get(key) or {}).get('size', 0)
+            self._index[key] = entry
+            self._evict()
+            self._schedule_save()
+
+        return data
+
+    def _decode(self, data) -> Image.Image:
+        image = Image.open(BytesIO(data))
+
+        # Scale to the maximum height while keeping the aspect ratio
+        new_height = self._max_height
+        new_width = int(image.width / image.height * new_height)
+        return image.resize((new_width, new_height))
+
+    def _load(self, url):
+        try:
+            image = self._decode(self._download(url))
+        except Exception:
+            image = None
+
+        self._dispatcher.post(self._deliver, url, image)
+
+    def _deliver(self, url, image):
+        with self._lock:
+            callbacks = self._pending.pop(url, [])
+            if image is not None:
+                self._images[url] = image
+
+        for callback in callbacks:
+            callback(image)
+
+    def request(self, url, callback):
+        # callback(image) runs on the Tk thread, image is None if the thumbnail couldn't be loaded
+        with self._lock:
+            image = self._images.get(url)
+            if image is None:
+                if url in self._pending:
+                    self._pending[url].append(callback)
+                    return
+                self._pending[url] = [callback]
+
+        if image is not None:
+            callback(image)
+            return
+
+        self._executor.submit(self._load, url)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+                self._save_index()
+
+class ScaledImageCache:
+    # Memoizes scaled copies per source image and width bucket, so a drag-resize reuses images
+    def __init__(self, dispatcher: Dispatcher, convert, bucket=16, max_bytes=64 * 1024 * 1024):
+        self._dispatcher = dispatcher
+        self._convert = convert
+        self._bucket = bucket
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._bytes = 0
+
+        # A single worker is enough, results for the final size are all we care about
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scaling')
+
+    def quantize(self, width) -> int:
+        # Round down so the image never grows its frame and triggers another resize
+        return max(self._bucket, width // self._bucket * self._bucket)
+
+    def request(self, image, width, callback):
+        # callback(converted) runs on the Tk thread, immediately if the size is already cached
+        width = self.quantize(width)
+        height = max(1, int(width * image.height / image.width))
+
+        # The source image is kept in the key, so its id can't be reused while the entry lives
+        key = (id(image), width)
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+            callback(entry[1])
+            return
+
+        if key in self._pending:
+            self._pending[key].append(callback)
+            return
+        self._pending[key] = [callback]
+
+        self._executor.submit(self._scale, key, image, (width, height))
+
+    def _scale(self, key, image, size):
+        try:
+            scaled = image.resize(size)
+        except Exception:
+            scaled = None
+
+        self._dispatcher.post(self._deliver, key, image, scaled)
+
+    def _deliver(self, key, image, scaled):
+        callbacks = self._pending.pop(key, [])
+        if scaled is None:
+            return
+
+        converted = self._convert(scaled)
+        self._entries[key] = (image, converted, scaled.width * scaled.height * len(scaled.getbands()))
+        self._bytes += self._entries[key][2]
+
+        while self._bytes > self._max_bytes and len(self._entries) > 1:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+        for callback in callbacks:
+            callback(converted)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,94 @@
+import asyncio
+import functools
+import threading
+from zen_explorer_core import installer, profiles, sources
+
+class OperationCancelled(Exception):
+    pass
+
+async def _git(args, cwd=None) -> str:
+    process = await asyncio.create_subprocess_exec(
+        'git', *args, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # Don't leave git running in the background
+        process.kill()
+        await process.wait()
+        raise
+
+    if process.returncode != 0:
+        raise RuntimeError(f'failed to update: {stderr.decode().strip()}')
+
+    return stdout.decode()
+
+async def _run_in_thread(func, *args, progress=None, **kwargs):
+    # Runs a blocking core function on the default executor, forwarding progress to the event loop.
+    # On cancellation the worker stops at its next progress report, before it touches another file, and we wait
+    # for it so no file is left half written.
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+
+    def report(*event):
+        if cancelled.is_set():
+            raise OperationCancelled()
+        if progress:
+            loop.call_soon_threadsafe(progress, *event)
+
+    future = loop.run_in_executor(None, functools.partial(func, *args, progress=report, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancelled.set()
+        try:
+            await future
+        except Exception:
+            pass
+        raise
+
+async def update_repository(repo: str = 'greeeen-dev/zen-custom-theme-store', shallow=True, sparse_themes=None,
+                            progress=None, source=None) -> set:
+    # progress(step) is called before every step, e.g. 'clone', 'fetch', 'diff' or 'catalog'
+    if source is None:
+        source = sources.GitSource(repo, shallow=shallow, sparse_themes=sparse_themes)
+
+    steps = source.steps()
+    result = None
+
+    try:
+        while True:
+            label, kind, target, args = steps.send(result)
+            if progress:
+                progress(label)
+
+            if kind == 'git':
+                result = await _git(target, cwd=args)
+            else:
+                result = await asyncio.to_thread(target, *args)
+    except StopIteration as stop:
+        return stop.value
+
+async def get_profiles(refresh=False) -> list:
+    return await asyncio.to_thread(profiles.get_profiles, refresh)
+
+async def install_themes(profile, theme_ids, bypass_install=False, compare='mtime', method='copy', progress=None):
+    # progress(theme_id, done, total) runs on the event loop before each theme and after every file operation.
+    # A cancelled install keeps the files it already wrote but not the manifest and CSS, which are written last,
+    # so the profile keeps loading the previous themes until the install is run again.
+    await _run_in_thread(
+        installer.install_themes, profile, theme_ids, bypass_install=bypass_install,
+        compare=compare, method=method, progress=progress
+    )
+
+async def install_theme(profile, theme_id, bypass_install=False, compare='mtime', method='copy', progress=None):
+    await install_themes(
+        profile, [theme_id], bypass_install=bypass_install, compare=compare, method=method, progress=progress
+    )
+
+async def uninstall_themes(profile, theme_ids, progress=None):
+    await _run_in_thread(installer.uninstall_themes, profile, theme_ids, progress=progress)
+
+async def uninstall_theme(profile, theme_id, progress=None):
+    await uninstall_themes(profile, [theme_id], progress=progress)
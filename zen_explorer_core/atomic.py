@@ -0,0 +1,21 @@
+import os
+import json
+import tempfile
+
+def write(path, data):
+    # data is str or bytes. The temporary file gets a unique name in the target's folder, so readers never see a
+    # partial file and two writers (the daemon and a --no-daemon CLI run) never rename each other's file away.
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.zen-explorer-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def write_json(path, data, **kwargs):
+    # kwargs go to json.dumps, e.g. separators=(',', ':') or indent=4
+    write(path, json.dumps(data, **kwargs))
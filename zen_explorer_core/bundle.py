@@ -0,0 +1,258 @@
+import os
+import re
+import json
+import hashlib
+import posixpath
+from typing import Optional
+from zen_explorer_core import atomic, css, timing
+
+# Lives next to userChrome.css, its presence is what turns bundle mode on for a profile
+cache_name = 'zen-explorer-bundle.json'
+cache_version = 2
+# The bundles get files of their own and one @import each, inlined rules in userChrome.css would come before
+# the user's own @import and @namespace lines, and the browser ignores those once a style rule was seen
+chrome_bundle_name = 'zen-explorer-bundle.css'
+content_bundle_name = 'zen-explorer-bundle-content.css'
+
+# Comments and strings are matched first so imports and urls inside them are left alone
+_token = re.compile(
+    r'/\*.*?\*/'
+    r'|@import\s+(?:url\(\s*(["\']?)(.*?)\1\s*\)|(["\'])(.*?)\3)\s*([^;]*);'
+    r'|url\(\s*(["\']?)(.*?)\6\s*\)'
+    r'|"(?:\\.|[^"\\])*"'
+    r"|'(?:\\.|[^'\\])*'"
+    r'|@(namespace|charset)\b[^;]*;',
+    re.S
+)
+_minify_token = re.compile(
+    r'/\*.*?\*/'
+    r'|"(?:\\.|[^"\\])*"'
+    r"|'(?:\\.|[^'\\])*'"
+    r'|\s*;\s*(})\s*'
+    r'|\s*([{};,>])\s*'
+    r'|\s+',
+    re.S
+)
+# Schemes (chrome:, data:, https: ...), absolute paths and fragments don't depend on the file's location
+_absolute = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|/|#)')
+
+def _cache_path(chrome_path) -> str:
+    return f'{chrome_path}/{cache_name}'
+
+def load_cache(chrome_path) -> Optional[dict]:
+    # Returns None when bundle mode is off for this profile
+    try:
+        with open(_cache_path(chrome_path)) as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        cache = None
+
+    if not isinstance(cache, dict) or cache.get('version') != cache_version:
+        # Unreadable or from another version, keep bundle mode on but rebuild everything
+        minify = bool(cache.get('minify')) if isinstance(cache, dict) else False
+        return {'version': cache_version, 'minify': minify, 'chunks': {}}
+
+    return cache
+
+def _save_cache(chrome_path, cache):
+    atomic.write_json(_cache_path(chrome_path), cache, separators=(',', ':'))
+
+def enable(chrome_path, minify=False):
+    # Switching modes drops every cached chunk, they were built with the old settings
+    cache = load_cache(chrome_path)
+    if not cache or cache.get('minify') != minify:
+        _save_cache(chrome_path, {'version': cache_version, 'minify': minify, 'chunks': {}})
+
+def disable(chrome_path):
+    for name in (cache_name, chrome_bundle_name, content_bundle_name):
+        try:
+            os.remove(f'{chrome_path}/{name}')
+        except FileNotFoundError:
+            pass
+
+def write(chrome_path, chrome, content) -> tuple:
+    # Writes the bodies returned by build, returns the managed blocks that import them
+    managed = []
+    for name, text in ((chrome_bundle_name, chrome), (content_bundle_name, content)):
+        path = f'{chrome_path}/{name}'
+        if not text:
+            if os.path.exists(path):
+                os.remove(path)
+            managed.append('')
+            continue
+
+        if css.write_file(path, text):
+            timing.add(files=1, bytes=len(text.encode()))
+        managed.append(f'@import url("{name}");')
+
+    return tuple(managed)
+
+def minify_css(text) -> str:
+    def replace(match):
+        token = match.group(0)
+        if token.startswith('/*'):
+            return ''
+        if token[0] in '"\'':
+            return token
+        if match.group(1) or match.group(2):
+            # Drop the whitespace around punctuation and the last semicolon of a block
+            return match.group(1) or match.group(2)
+        return ' '
+
+    return _minify_token.sub(replace, text).strip()
+
+def _rewrite(url, directory) -> str:
+    # Relative urls are rebased from the theme file onto the chrome folder, where the bundle lives
+    if not url or _absolute.match(url):
+        return url
+
+    return posixpath.normpath(posixpath.join(directory, url))
+
+def _file_entry(path, data=None) -> Optional[list]:
+    try:
+        file_stat = os.stat(path)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+    except FileNotFoundError:
+        return None
+
+    return [file_stat.st_size, file_stat.st_mtime_ns, hashlib.sha256(data).hexdigest()]
+
+def _resolve(chrome_path, rel, stack: list, deps: dict, imports: list) -> Optional[str]:
+    # Inlines every relative @import of chrome_path/rel, recording each file read in deps.
+    # Imports that can't be inlined are collected in imports, they have to lead the bundle to stay valid.
+    # Returns None for a file that declares a @namespace, the declaration only applies to its own file and is
+    # ignored after other rules, so the file has to stay an @import.
+    try:
+        with open(f'{chrome_path}/{rel}', 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        deps[rel] = None
+        return ''
+
+    deps[rel] = _file_entry(f'{chrome_path}/{rel}', data)
+    directory = posixpath.dirname(rel)
+    imported = len(imports)
+    namespaced = []
+
+    def replace(match):
+        token = match.group(0)
+        if token.startswith('/*') or token[0] in '"\'':
+            return token
+        if match.group(8) == 'namespace':
+            namespaced.append(token)
+            return token
+        if match.group(8) == 'charset':
+            # Only valid as the very first rule of a file, the bundle is written as UTF-8 anyway
+            return ''
+
+        if token.startswith('@'):
+            url = match.group(2) if match.group(2) is not None else match.group(4)
+            conditions = match.group(5).strip()
+            target = _rewrite(url, directory)
+
+            # Remote imports and layer()/supports() conditions are kept as imports
+            if _absolute.match(url) or conditions.startswith(('layer', 'supports')):
+                imports.append(f'@import url("{target}"){" " + conditions if conditions else ""};')
+                return ''
+            if target in stack:
+                # Circular import, the browser would skip it as well
+                return ''
+
+            stack.append(target)
+            body = _resolve(chrome_path, target, stack, deps, imports)
+            stack.pop()
+
+            if body is None:
+                imports.append(f'@import url("{target}"){" " + conditions if conditions else ""};')
+                return ''
+            return f'@media {conditions} {{\n{body}\n}}' if conditions else body
+
+        return f'url("{_rewrite(match.group(7), directory)}")'
+
+    text = _token.sub(replace, data.decode('utf-8', errors='replace').lstrip('\ufeff'))
+    if namespaced:
+        # The file imports its own dependencies once it's loaded by itself
+        del imports[imported:]
+        return None
+
+    return text
+
+def _unchanged(chrome_path, deps: dict) -> bool:
+    # Stat first and only hash files whose size or mtime moved, a touched but identical file is still a hit
+    for rel, entry in deps.items():
+        try:
+            file_stat = os.stat(f'{chrome_path}/{rel}')
+        except FileNotFoundError:
+            if entry is None:
+                continue
+            return False
+
+        if entry is None:
+            return False
+        if [file_stat.st_size, file_stat.st_mtime_ns] == entry[:2]:
+            continue
+
+        current = _file_entry(f'{chrome_path}/{rel}')
+        if not current or current[2] != entry[2]:
+            return False
+        entry[:2] = current[:2]
+
+    return True
+
+def _chunk(chrome_path, rel, cache) -> dict:
+    chunk = cache['chunks'].get(rel)
+    if chunk and _unchanged(chrome_path, chunk['deps']):
+        return chunk
+    timing.add(files=1)
+
+    deps = {}
+    imports = []
+    text = _resolve(chrome_path, rel, [rel], deps, imports)
+    if text is None:
+        imports.append(f'@import url("{rel}");')
+        text = ''
+    elif cache['minify']:
+        text = minify_css(text)
+    else:
+        text = text.strip()
+
+    chunk = {'deps': deps, 'imports': imports, 'css': text}
+    cache['chunks'][rel] = chunk
+
+    return chunk
+
+def _join(chunks: list, targets: list, minify) -> str:
+    # Imports that weren't inlined are only valid before any other rule, so they lead the bundle
+    parts = list(dict.fromkeys(line for chunk in chunks for line in chunk['imports']))
+    for rel, chunk in zip(targets, chunks):
+        parts.append(chunk['css'] if minify else f'/* {rel} */\n{chunk["css"]}')
+
+    return '\n'.join(parts) if minify else '\n\n'.join(parts)
+
+def build(chrome_path, chrome_targets: list, content_targets: list, cache: Optional[dict] = None) -> tuple:
+    # Targets are paths relative to the chrome folder, returns the userChrome.css and userContent.css bodies.
+    # Only targets whose own files or imported files changed are resolved again.
+    if cache is None:
+        cache = load_cache(chrome_path)
+    if cache is None:
+        raise RuntimeError('bundle mode is not enabled')
+
+    chrome_chunks = [_chunk(chrome_path, rel, cache) for rel in chrome_targets]
+    content_chunks = [_chunk(chrome_path, rel, cache) for rel in content_targets]
+
+    # Drop chunks for themes that are no longer installed
+    wanted = set(chrome_targets) | set(content_targets)
+    for rel in list(cache['chunks']):
+        if rel not in wanted:
+            del cache['chunks'][rel]
+
+    _save_cache(chrome_path, cache)
+
+    return (
+        _join(chrome_chunks, chrome_targets, cache['minify']),
+        _join(content_chunks, content_targets, cache['minify'])
+    )
@@ -0,0 +1,178 @@
+import os
+import json
+import shutil
+from typing import Optional
+from zen_explorer_core import atomic, sync, timing
+
+# Bump this whenever the snapshot layout changes
+catalog_version = 5
+
+def _read_packed_ref(git_dir, ref) -> Optional[str]:
+    try:
+        with open(f'{git_dir}/packed-refs') as f:
+            for line in f:
+                if line.startswith('#') or line.startswith('^'):
+                    continue
+                sha, _, name = line.rstrip('\n').partition(' ')
+                if name == ref:
+                    return sha
+    except FileNotFoundError:
+        pass
+
+    return None
+
+def git_head(path) -> Optional[str]:
+    # Resolve HEAD by reading .git directly, spawning git here would cost more than the cache saves
+    git_dir = f'{path}/.git'
+
+    try:
+        with open(f'{git_dir}/HEAD') as f:
+            head = f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+    if not head.startswith('ref: '):
+        return head
+
+    ref = head[5:]
+    try:
+        with open(f'{git_dir}/{ref}') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return _read_packed_ref(git_dir, ref)
+
+def catalog_key(path) -> Optional[dict]:
+    try:
+        themes_stat = os.stat(f'{path}/themes.json')
+        themes_dir_stat = os.stat(f'{path}/themes')
+    except FileNotFoundError:
+        return None
+
+    return {
+        'version': catalog_version,
+        'head': git_head(path),
+        'themesJson': [themes_stat.st_mtime_ns, themes_stat.st_size],
+        'themesDir': themes_dir_stat.st_mtime_ns
+    }
+
+def theme_files(path, zen_theme, install_data, hash_cache=None) -> Optional[dict]:
+    # {relative path: [size, sha256]} for everything the theme installs
+    root = f'{path}/themes/{zen_theme}'
+    try:
+        source = sync.scan_source(root, install_data.get('files'), install_data.get('folders'))
+    except FileNotFoundError:
+        # Broken theme, or outside a sparse checkout
+        return None
+
+    digest = hash_cache.digest if hash_cache else sync.file_hash
+    return {file: [source[file][0], digest(f'{root}/{file}')] for file in source}
+
+def files_hash(files: Optional[dict]) -> Optional[str]:
+    if files is None:
+        return None
+
+    return sync.combine_hashes({file: files[file][1] for file in files})
+
+def files_dir(cache_path) -> str:
+    # Per-file hashes live next to the snapshot, one small file per theme, so startup never parses them and an
+    # install only reads the themes it installs
+    root, _ = os.path.splitext(cache_path)
+    return f'{root}-files'
+
+def _files_path(cache_path, zen_theme) -> str:
+    return f'{files_dir(cache_path)}/{zen_theme}.json'
+
+def build_catalog(path, cache_path, previous: Optional[dict] = None, changed: Optional[set] = None,
+                  hash_cache=None) -> tuple:
+    # previous is an older snapshot, only themes in changed are re-read and re-hashed.
+    # Returns (themes, install data, content hashes, {theme id: files} for the themes that were rebuilt).
+    key = catalog_key(path)
+
+    with open(f'{path}/themes.json') as f:
+        themes = json.load(f)
+
+    os.makedirs(files_dir(cache_path), exist_ok=True)
+    install_data = {}
+    hashes = {}
+    files = {}
+    for zen_theme in themes:
+        if (
+            previous and changed is not None and zen_theme not in changed and zen_theme in previous['install']
+            and os.path.isfile(_files_path(cache_path, zen_theme))
+        ):
+            install_data[zen_theme] = previous['install'][zen_theme]
+            hashes[zen_theme] = previous['hashes'].get(zen_theme)
+            continue
+
+        try:
+            with open(f'{path}/themes/{zen_theme}/theme.json') as f:
+                install_data[zen_theme] = json.load(f)
+        except FileNotFoundError:
+            continue
+
+        files[zen_theme] = theme_files(path, zen_theme, install_data[zen_theme], hash_cache=hash_cache)
+        hashes[zen_theme] = files_hash(files[zen_theme])
+        if files[zen_theme] is not None:
+            atomic.write_json(
+                _files_path(cache_path, zen_theme), {'hash': hashes[zen_theme], 'files': files[zen_theme]},
+                separators=(',', ':')
+            )
+        timing.add(files=1)
+
+    # Themes that were removed take their hashes with them
+    for name in os.listdir(files_dir(cache_path)):
+        if name[:-len('.json')] not in install_data:
+            os.remove(f'{files_dir(cache_path)}/{name}')
+
+    atomic.write_json(
+        cache_path, {'key': key, 'themes': themes, 'install': install_data, 'hashes': hashes}, separators=(',', ':')
+    )
+
+    return themes, install_data, hashes, files
+
+def read_files(cache_path, zen_theme, content_hash) -> Optional[dict]:
+    # {relative path: [size, sha256]}, None unless the hashes belong to the catalog's version of the theme
+    if content_hash is None:
+        return None
+
+    try:
+        with open(_files_path(cache_path, zen_theme)) as f:
+            sidecar = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if not isinstance(sidecar, dict) or sidecar.get('hash') != content_hash:
+        return None
+
+    return sidecar['files']
+
+def read_snapshot(cache_path) -> Optional[dict]:
+    try:
+        with open(cache_path) as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if not isinstance(snapshot, dict) or (snapshot.get('key') or {}).get('version') != catalog_version:
+        return None
+
+    return snapshot
+
+def load_catalog(path, cache_path) -> Optional[tuple]:
+    key = catalog_key(path)
+    if not key:
+        return None
+
+    # Stale or foreign snapshots are ignored, the caller falls back to themes.json
+    snapshot = read_snapshot(cache_path)
+    if not snapshot or snapshot.get('key') != key:
+        return None
+
+    return snapshot['themes'], snapshot['install'], snapshot['hashes']
+
+def delete_catalog(cache_path):
+    try:
+        os.remove(cache_path)
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(files_dir(cache_path), ignore_errors=True)
@@ -0,0 +1,88 @@
+import os
+import re
+import shutil
+import filecmp
+import tempfile
+
+begin_marker = '/* zen-explorer: begin managed block, changes here will be overwritten */'
+end_marker = '/* zen-explorer: end managed block */'
+
+# Lines written by versions that predate the managed block, only ever matched as whole lines
+_legacy_import = re.compile(r'@import url\("zen-explorer-themes/[^"]*"\);')
+_legacy_header = "/* User's custom CSS */"
+
+def _user_lines(f):
+    # Streams every line outside the managed block, minus legacy lines and leading blank lines
+    in_block = False
+    leading = True
+
+    for line in f:
+        stripped = line.strip()
+
+        if in_block:
+            if stripped == end_marker:
+                in_block = False
+            continue
+        if stripped == begin_marker:
+            in_block = True
+            continue
+        if stripped == _legacy_header or _legacy_import.fullmatch(stripped):
+            continue
+        if leading and not stripped:
+            continue
+
+        leading = False
+        yield line
+
+def _write(f, managed, source):
+    f.write(begin_marker + '\n')
+    if managed:
+        f.write(managed + '\n')
+    f.write(end_marker + '\n')
+
+    first = True
+    for line in _user_lines(source):
+        if first:
+            # Keep user CSS visually separate from the managed block
+            f.write('\n')
+            first = False
+        f.write(line)
+
+def _replace(path, write) -> bool:
+    # write(f, source) fills the new file, source is the current file or [] when there is none.
+    # Returns whether the file changed, unchanged files are left untouched so the browser doesn't reload them.
+    directory = os.path.dirname(path)
+    exists = os.path.isfile(path)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.zen-explorer-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            if exists:
+                with open(path, 'r', encoding='utf-8', newline='') as source:
+                    write(f, source)
+            else:
+                write(f, [])
+
+        if exists and filecmp.cmp(temp_path, path, shallow=False):
+            os.remove(temp_path)
+            return False
+
+        if exists:
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+
+        # Rename over the original so a crash never leaves a half-written file behind
+        os.replace(temp_path, path)
+        return True
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def write_managed(path, managed) -> bool:
+    return _replace(path, lambda f, source: _write(f, managed, source))
+
+def write_file(path, text) -> bool:
+    # Whole file owned by zen-explorer, e.g. a CSS bundle
+    return _replace(path, lambda f, _source: f.write(text + '\n'))
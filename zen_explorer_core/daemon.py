@@ -0,0 +1,48 @@
+import os
+import json
+import socket
+from typing import Optional
+from zen_explorer_core import paths
+
+# Client side of the daemon, kept free of the rest of the core so talking to a running daemon stays cheap.
+# The daemon itself lives in zen_explorer_core.server.
+
+# One JSON object per connection each way:
+#   request   {"args": [command, ...], "cwd": "...", "timings": null | "text" | "json"}, {"ping": true} or {"stop": true}
+#   response  {"stdout": "...", "stderr": "...", "error": null | "<traceback>"}
+
+def socket_path() -> str:
+    return f'{paths.save_dir}/daemon.sock'
+
+def _send(message, timeout=None) -> Optional[dict]:
+    # Returns None when no daemon is listening
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        try:
+            client.connect(socket_path())
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+
+        client.sendall(json.dumps(message).encode() + b'\n')
+        response = b''.join(iter(lambda: client.recv(65536), b''))
+    finally:
+        client.close()
+
+    if not response:
+        raise RuntimeError('daemon closed the connection')
+
+    return json.loads(response)
+
+def request(args, timings=None, timeout=None) -> Optional[dict]:
+    # Runs a command in the daemon, None means there is no daemon and the caller should run it itself
+    return _send({'args': list(args), 'cwd': os.getcwd(), 'timings': timings}, timeout=timeout)
+
+def running() -> bool:
+    return _send({'ping': True}, timeout=5) is not None
+
+def stop() -> bool:
+    return _send({'stop': True}, timeout=5) is not None
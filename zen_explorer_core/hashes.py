@@ -0,0 +1,73 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from zen_explorer_core import atomic, sync
+
+def digests(paths, digest=sync.file_hash, jobs=None) -> dict:
+    # Hashes on a thread pool, hashlib releases the GIL while it works. Missing files map to None.
+    def safe_digest(path):
+        try:
+            return digest(path)
+        except FileNotFoundError:
+            return None
+
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return dict(zip(paths, executor.map(safe_digest, paths)))
+
+class HashCache:
+    # sha256 per file, keyed by path and (size, mtime_ns) so only files that changed are hashed again
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[dict] = None
+        self._changed = False
+
+    def _get_entries(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self._path) as f:
+                    self._entries = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._entries = {}
+
+        return self._entries
+
+    def digest(self, path) -> str:
+        file_stat = os.stat(path)
+        key = [file_stat.st_size, file_stat.st_mtime_ns]
+        with self._lock:
+            entry = self._get_entries().get(path)
+        if entry and entry[:2] == key:
+            return entry[2]
+
+        digest = sync.file_hash(path)
+        with self._lock:
+            self._get_entries()[path] = key + [digest]
+            self._changed = True
+
+        return digest
+
+    def digests(self, paths, jobs=None) -> dict:
+        return digests(paths, digest=self.digest, jobs=jobs)
+
+    def forget(self, path):
+        # Drops the entry for a removed file, or every entry under a removed folder
+        folder = f'{path.rstrip("/")}/'
+        with self._lock:
+            entries = self._get_entries()
+            removed = [cached_path for cached_path in entries if cached_path == path or cached_path.startswith(folder)]
+            for cached_path in removed:
+                del entries[cached_path]
+                self._changed = True
+
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            atomic.write_json(self._path, self._entries, separators=(',', ':'))
+            self._changed = False
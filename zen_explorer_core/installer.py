@@ -1,76 +1,70 @@
 import os
+import copy
 import json
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from zen_explorer_core import profiles, repository
+from zen_explorer_core import atomic, bundle, catalog, css, profiles, repository, store, sync, timing
 from zen_explorer_core.models import theme
+from zen_explorer_core.models.plan import FileOperation, InstallPlan, SourcePlan
+from zen_explorer_core.models.profile import Profile
+from zen_explorer_core.models.update import ThemeUpdate, UpdateReport
 
-zen_profiles = profiles.get_profiles()
+# Schema 2 wraps the themes and records every installed file with its size and hash
+manifest_schema = 2
 
-def _profile_exists(profile):
-    if not profile in zen_profiles:
-        for profile_name in zen_profiles:
-            if profile == profile_name.split('.', 1)[0]:
-                return profile_name
+def _profile_exists(profile) -> Profile:
+    # Returns the resolved record, passing it on skips any further lookups
+    zen_profile = profiles.find_profile(profile)
+    if not zen_profile:
         raise NotADirectoryError('invalid profile')
-    else:
-        return profile
 
-def _build_css(data):
-    chrome_lines = []
-    content_lines = []
+    return zen_profile
+
+def _css_targets(data):
+    # Stylesheets to load, relative to the chrome folder and in install order
+    chrome_targets = []
+    content_targets = []
     for zen_theme in data:
         for target in data[zen_theme]['uclChromeTarget']:
-            chrome_lines.append(f'@import url("zen-explorer-themes/{zen_theme}/{target}");')
+            chrome_targets.append(f'zen-explorer-themes/{zen_theme}/{target}')
         for target in data[zen_theme]['uclContentTarget']:
-            content_lines.append(f'@import url("zen-explorer-themes/{zen_theme}/{target}");')
+            content_targets.append(f'zen-explorer-themes/{zen_theme}/{target}')
+
+    return chrome_targets, content_targets
 
-    return '\n'.join(chrome_lines), '\n'.join(content_lines)
+def _build_css(data):
+    chrome_targets, content_targets = _css_targets(data)
+
+    return (
+        '\n'.join(f'@import url("{target}");' for target in chrome_targets),
+        '\n'.join(f'@import url("{target}");' for target in content_targets)
+    )
 
 def _apply_css(path, data):
-    chrome, content = _build_css(data)
-    
-    # Preserve existing user CSS that's not managed by zen-explorer
-    existing_chrome_content = ""
-    existing_content_content = ""
-    
-    # Extract user's custom CSS from userChrome.css if it exists
-    if os.path.exists(f'{path}/chrome/userChrome.css'):
-        with open(f'{path}/chrome/userChrome.css', 'r') as f:
-            existing_chrome = f.read()
-            # Strip out any zen-explorer theme imports
-            user_lines = []
-            for line in existing_chrome.split('\n'):
-                if not ('zen-explorer-themes' in line and '@import url' in line):
-                    user_lines.append(line)
-            existing_chrome_content = '\n'.join(user_lines).strip()
-            
-    # Extract user's custom CSS from userContent.css if it exists
-    if os.path.exists(f'{path}/chrome/userContent.css'):
-        with open(f'{path}/chrome/userContent.css', 'r') as f:
-            existing_content = f.read()
-            # Strip out any zen-explorer theme imports
-            user_lines = []
-            for line in existing_content.split('\n'):
-                if not ('zen-explorer-themes' in line and '@import url' in line):
-                    user_lines.append(line)
-            existing_content_content = '\n'.join(user_lines).strip()
-    
-    # Combine zen-explorer imports with user's custom CSS
-    final_chrome = chrome
-    if existing_chrome_content:
-        final_chrome = chrome + "\n\n/* User's custom CSS */\n" + existing_chrome_content
-        
-    final_content = content
-    if existing_content_content:
-        final_content = content + "\n\n/* User's custom CSS */\n" + existing_content_content
-    
-    # Write combined content back to files
-    with open(f'{path}/chrome/userChrome.css', 'w+') as f:
-        f.write(final_chrome)
-
-    with open(f'{path}/chrome/userContent.css', 'w+') as f:
-        f.write(final_content)
+    # Bundled profiles get every stylesheet inlined into one file, so the browser doesn't resolve imports one by one
+    # at startup
+    bundle_cache = bundle.load_cache(f'{path}/chrome')
+    if bundle_cache:
+        with timing.span('installer.bundle'):
+            chrome, content = bundle.write(
+                f'{path}/chrome', *bundle.build(f'{path}/chrome', *_css_targets(data), cache=bundle_cache)
+            )
+    else:
+        chrome, content = _build_css(data)
+
+    # User CSS outside the managed block is preserved, and unchanged files aren't rewritten
+    with timing.span('installer.css'):
+        for file, managed in (('userChrome.css', chrome), ('userContent.css', content)):
+            if css.write_managed(f'{path}/chrome/{file}', managed):
+                timing.add(files=1, bytes=len(managed.encode()))
+
+def _repository_data() -> repository.RepositoryData:
+    repository_data = repository.get_repository()
+    if not repository_data:
+        raise NotADirectoryError('repository not available, run update_repository')
+
+    return repository_data
 
 def _profile_path(profile):
     return profiles.get_profile_path(profile)
@@ -93,130 +87,430 @@ def check_installed(profile):
 
     return os.path.isdir(f'{path}/chrome') and os.path.isfile(f'{path}/chrome/zen-explorer.json')
 
-def install_theme(profile, theme_id, bypass_install=False, staging=False):
-    profile = _profile_exists(profile)
-    if (check_userchrome(profile) or check_usercontent(profile)) and not check_installed(profile) and not bypass_install:
-        raise RuntimeError('userchrome or usercontent already exists, set bypass_install to True to bypass')
+def _read_manifest(profile_path) -> dict:
+    # Returns {theme id: entry} for both schemas. Parsed manifests are kept per (mtime_ns, size) and shared
+    # between callers, copy before modifying.
+    path = f'{profile_path}/chrome/zen-explorer.json'
+    file_stat = os.stat(path)
+    key = (file_stat.st_mtime_ns, file_stat.st_size)
+
+    cached = _manifests.get(path)
+    if not cached or cached[0] != key:
+        with open(path, 'r') as f:
+            cached = (key, _migrate_manifest(json.load(f)))
+        _manifests[path] = cached
+
+    return cached[1]
+
+def _migrate_manifest(manifest: dict) -> dict:
+    # Schema 1 is the bare {theme id: entry} mapping. Its entries have no 'files', they're upgraded by walking
+    # the installed tree once and written back as schema 2 on the next install.
+    if 'schema' not in manifest:
+        return manifest
 
-    zen_theme: Optional[theme.Theme] = repository.data.get_theme(theme_id)
-    if not zen_theme:
-        raise FileNotFoundError('theme not found')
+    if manifest['schema'] > manifest_schema:
+        raise ValueError(f'unsupported manifest schema: {manifest["schema"]}')
 
+    return manifest['themes']
+
+def _write_manifest(profile_path, data):
+    path = f'{profile_path}/chrome/zen-explorer.json'
+    _manifests.pop(path, None)
+
+    atomic.write_json(path, {'schema': manifest_schema, 'themes': data}, indent=4)
+
+def _write_state(profile_path, data):
+    # The manifest and both CSS files are written once per batch, not once per theme
+    with timing.span('installer.manifest'):
+        _write_manifest(profile_path, data)
+        timing.add(files=1)
+    _apply_css(profile_path, data)
+
+def set_bundle(profile, enabled=True, minify=False):
+    # Switches a profile between one @import per stylesheet and a single bundled file, then rewrites its CSS
+    profile = _profile_exists(profile)
     if not check_installed(profile):
-        new_data = {}
-    else:
-        with open(f'{_profile_path(profile)}/chrome/zen-explorer.json', 'r') as f:
-            new_data = json.load(f)
-
-    new_data[theme_id] = {
-        'version': zen_theme.version,
-        'updatedAt': zen_theme.updated_at.timestamp(),
-        'uclChromeTarget': zen_theme.chrome_targets,
-        'uclContentTarget': zen_theme.content_targets
-    }
-
-    if not staging:
-        if not os.path.isdir(f'{_profile_path(profile)}/chrome'):
-            os.makedirs(f'{_profile_path(profile)}/chrome')
-        if not os.path.isdir(f'{_profile_path(profile)}/chrome/zen-explorer-themes'):
-            os.makedirs(f'{_profile_path(profile)}/chrome/zen-explorer-themes')
-
-    if staging:
-        print('Simulated data update')
-        print(new_data)
+        raise RuntimeError('not installed')
+
+    profile_path = _profile_path(profile)
+    if enabled:
+        bundle.enable(f'{profile_path}/chrome', minify=minify)
     else:
-        with open(f'{_profile_path(profile)}/chrome/zen-explorer.json', 'w+') as f:
-            # noinspection PyTypeChecker
-            json.dump(new_data, f, indent=4)
+        bundle.disable(f'{profile_path}/chrome')
+
+    _apply_css(profile_path, _read_manifest(profile_path))
+
+def _css_diff(before: dict, after: dict) -> dict:
+    diff = {}
+    for file, old, new in zip(('userChrome.css', 'userContent.css'), _css_targets(before), _css_targets(after)):
+        diff[file] = {
+            'added': [target for target in new if target not in old],
+            'removed': [target for target in old if target not in new]
+        }
+
+    return diff
+
+def plan_source(theme_ids) -> SourcePlan:
+    # Resolves and scans every theme once, a bad id fails here before any profile is looked at
+    repository_data = _repository_data()
+    repository_path = repository.repository_path()
+    revision = repository.revision()
+    sources = {}
+    entries = {}
+
+    with timing.span('installer.scan', themes=len(theme_ids)):
+        for theme_id in theme_ids:
+            zen_theme: Optional[theme.Theme] = repository_data.get_theme(theme_id)
+            if not zen_theme:
+                raise FileNotFoundError(f'theme not found: {theme_id}')
+
+            sources[theme_id] = sync.scan_source(
+                f'{repository_path}/themes/{theme_id}', zen_theme.files, zen_theme.folders
+            )
+            entries[theme_id] = {
+                'version': zen_theme.version,
+                'updatedAt': zen_theme.updated_at_timestamp,
+                'revision': revision,
+                'uclChromeTarget': list(zen_theme.chrome_targets),
+                'uclContentTarget': list(zen_theme.content_targets)
+            }
+
+        # The catalog recorded these hashes, only themes whose files drifted from it go through the hash cache
+        files = {}
+        pending = []
+        for theme_id, source in sources.items():
+            recorded = repository_data.file_hashes(theme_id)
+            if recorded is not None and recorded.keys() == source.keys() and all(
+                recorded[path][0] == source[path][0] for path in source
+            ):
+                files[theme_id] = recorded
+            else:
+                pending.append(theme_id)
+
+        if pending:
+            hash_cache = repository.get_hash_cache()
+            # Kept in memory, planning writes nothing and execute_plan persists the cache
+            digests = hash_cache.digests(
+                f'{repository_path}/themes/{theme_id}/{path}' for theme_id in pending for path in sources[theme_id]
+            )
+
+            for theme_id in pending:
+                files[theme_id] = {
+                    path: [size, digests[f'{repository_path}/themes/{theme_id}/{path}']]
+                    for path, (size, _) in sources[theme_id].items()
+                }
+
+        for theme_id in sources:
+            entries[theme_id]['hash'] = catalog.files_hash(files[theme_id])
+            entries[theme_id]['files'] = files[theme_id]
+
+    return SourcePlan(repository_path, sources, entries)
+
+def plan_install(profile, source_plan: SourcePlan, bypass_install=False, compare='mtime') -> InstallPlan:
+    # Side effect free, only reads the profile's manifest and theme folders
+    profile = _profile_exists(profile)
+    installed = check_installed(profile)
+    if (check_userchrome(profile) or check_usercontent(profile)) and not installed and not bypass_install:
+        raise RuntimeError('userchrome or usercontent already exists, set bypass_install to True to bypass')
 
-    theme_path = f'{repository.repository_path()}/themes/{theme_id}'
     profile_path = _profile_path(profile)
+    before = copy.deepcopy(_read_manifest(profile_path)) if installed else {}
+    after = dict(before)
+    operations = []
+
+    for theme_id, source in source_plan.sources.items():
+        # Only copy what changed since the last install, and drop files the theme no longer ships
+        destination_path = f'{profile_path}/chrome/zen-explorer-themes/{theme_id}'
+        installed_files = before.get(theme_id, {}).get('files')
+        if installed_files is not None and os.path.isdir(destination_path):
+            # The manifest records what's installed, so the delta comes straight from the hashes
+            file_operations = sync.diff_files(installed_files, source_plan.entries[theme_id]['files'])
+            destination = installed_files
+        else:
+            destination = sync.scan_destination(destination_path)
+            file_operations = sync.diff_tree(
+                f'{source_plan.repository_path}/themes/{theme_id}', destination_path, source, destination,
+                compare=compare
+            )
 
-    # Replace theme path with a simulated data copy
-    if not staging:
-        if os.path.isdir(f'{profile_path}/chrome/zen-explorer-themes/{theme_id}'):
-            shutil.rmtree(f'{profile_path}/chrome/zen-explorer-themes/{theme_id}')
-        os.makedirs(f'{profile_path}/chrome/zen-explorer-themes/{theme_id}')
+        for operation, path in file_operations:
+            size = destination[path][0] if operation == 'delete' else source[path][0]
+            operations.append(FileOperation(theme_id, operation, path, size))
 
-    for file in zen_theme.files:
-        if staging:
-            print(f'Simulated data copy: {theme_path}/{file} => {profile_path}/chrome/zen-explorer-themes/{theme_id}/{file}')
-        else:
-            shutil.copy2(f'{theme_path}/{file}', f'{profile_path}/chrome/zen-explorer-themes/{theme_id}/{file}')
+        after[theme_id] = source_plan.entries[theme_id]
 
-    for folder in zen_theme.folders:
-        if staging:
-            print(f'Simulated data copy: {theme_path}/{folder} => {profile_path}/chrome/zen-explorer-themes/{theme_id}/{folder}')
-        else:
-            shutil.copytree(f'{theme_path}/{folder}', f'{profile_path}/chrome/zen-explorer-themes/{theme_id}/{folder}')
-
-    # We can overwrite userChrome and userContent here
-    if staging:
-        chrome, content = _build_css(new_data)
-        print('Simulated chrome write')
-        print(chrome)
-        print('\nSimulated content write')
-        print(content)
-    else:
-        _apply_css(profile_path, new_data)
+    return InstallPlan(profile, source_plan, tuple(operations), before, after, _css_diff(before, after))
 
-def uninstall_theme(profile, theme_id, staging=False):
+def plan_uninstall(profile, theme_ids) -> InstallPlan:
     profile = _profile_exists(profile)
     if not check_installed(profile):
         raise RuntimeError('not installed')
 
     profile_path = _profile_path(profile)
+    before = copy.deepcopy(_read_manifest(profile_path))
+    after = dict(before)
+    operations = []
+
+    for theme_id in theme_ids:
+        if not theme_id in before:
+            raise FileNotFoundError(f'theme not installed: {theme_id}')
+
+        installed_files = before[theme_id].get('files')
+        if installed_files is None:
+            installed_files = sync.scan_destination(f'{profile_path}/chrome/zen-explorer-themes/{theme_id}')
+        size = sum(entry[0] for entry in installed_files.values())
+        operations.append(FileOperation(theme_id, 'remove', '', size))
+        after.pop(theme_id)
+
+    return InstallPlan(profile, None, tuple(operations), before, after, _css_diff(before, after))
+
+def execute_plan(plan: InstallPlan, method='copy', progress=None):
+    # progress(theme_id, done, total) is called with done=0 before a theme's first operation and after every
+    # operation, raising from it stops the install before the next file is touched. Files already written stay,
+    # but the manifest and CSS are written last, so the profile keeps loading the previous themes and running the
+    # same plan again finishes the job.
+    # method='store' hardlinks files from the shared content-addressed store instead of copying them.
+    profile_path = plan.profile.path
+    transfer = store.transfer if method == 'store' else None
+    os.makedirs(f'{profile_path}/chrome/zen-explorer-themes', exist_ok=True)
+
+    theme_operations = {}
+    for operation in plan.operations:
+        theme_operations.setdefault(operation.theme_id, []).append(operation)
+
+    for theme_id, operations in theme_operations.items():
+        theme_path = f'{profile_path}/chrome/zen-explorer-themes/{theme_id}'
+        with timing.span('installer.sync', theme=theme_id):
+            if progress:
+                progress(theme_id, 0, len(operations))
+
+            if operations[0].operation == 'remove':
+                shutil.rmtree(theme_path, ignore_errors=True)
+                if progress:
+                    progress(theme_id, 1, 1)
+                continue
+
+            sync.apply_operations(
+                f'{plan.source.repository_path}/themes/{theme_id}', theme_path,
+                [(operation.operation, operation.path) for operation in operations], method=method,
+                progress=(lambda done, total, theme_id=theme_id: progress(theme_id, done, total)) if progress else None,
+                transfer=transfer
+            )
+            transferred = [operation for operation in operations if operation.operation != 'delete']
+            timing.add(files=len(transferred), bytes=sum(operation.size for operation in transferred))
+
+    _write_state(profile_path, plan.manifest_after)
+
+    # Hashes from planning and from the store are only saved once the plan was applied
+    repository.get_hash_cache().save()
+    # Replaced and removed files may have been the last links to their store objects
+    if store.in_use() and any(operation.operation != 'copy' for operation in plan.operations):
+        store.collect()
+
+def install_themes(
+    profile, theme_ids, bypass_install=False, staging=False, compare='mtime', method='copy',
+    source_plan: Optional[SourcePlan] = None, progress=None
+) -> InstallPlan:
+    # staging only plans, returning what would change without touching the profile.
+    # A source plan from plan_source can be passed in to share one scan across several profiles.
+    profile = _profile_exists(profile)
+    with timing.span('installer.install', profile=profile.folder, themes=len(theme_ids)):
+        plan = plan_install(
+            profile, source_plan or plan_source(theme_ids), bypass_install=bypass_install, compare=compare
+        )
+        if not staging:
+            execute_plan(plan, method=method, progress=progress)
+
+    return plan
+
+def install_theme(profile, theme_id, bypass_install=False, staging=False, compare='mtime', method='copy'):
+    return install_themes(
+        profile, [theme_id], bypass_install=bypass_install, staging=staging, compare=compare, method=method
+    )
+
+def plan_profiles(theme_ids, zen_profiles=None, bypass_install=False, compare='mtime') -> dict:
+    # Returns {profile folder: InstallPlan or exception}, previews a rollout without touching any profile
+    if zen_profiles is None:
+        zen_profiles = profiles.get_profiles()
+
+    source_plan = plan_source(theme_ids)
+    plans = {}
+    for profile in zen_profiles:
+        try:
+            zen_profile = _profile_exists(profile)
+            plans[zen_profile.folder] = plan_install(
+                zen_profile, source_plan, bypass_install=bypass_install, compare=compare
+            )
+        except (OSError, RuntimeError, ValueError) as error:
+            plans[getattr(profile, 'folder', profile)] = error
+
+    return plans
+
+def install_themes_to_profiles(
+    theme_ids, zen_profiles=None, jobs=None, bypass_install=False, staging=False, compare='mtime', method='copy'
+) -> dict:
+    # Returns {profile folder: InstallPlan or exception}, one failing profile doesn't stop the others
+    if zen_profiles is None:
+        zen_profiles = profiles.get_profiles()
+
+    # Scan the source trees once and share them with every worker
+    source_plan = plan_source(theme_ids)
+
+    results = {}
+    tasks = {}
+    for profile in zen_profiles:
+        try:
+            zen_profile = _profile_exists(profile)
+        except OSError as error:
+            results[getattr(profile, 'folder', profile)] = error
+            continue
 
-    with open(f'{profile_path}/chrome/zen-explorer.json', 'r') as f:
-        data = json.load(f)
+        tasks[zen_profile] = (lambda zen_profile=zen_profile: install_themes(
+            zen_profile, theme_ids, bypass_install=bypass_install, staging=staging,
+            compare=compare, method=method, source_plan=source_plan
+        ))
 
-    if not theme_id in data:
-        raise FileNotFoundError('theme not installed')
+    results.update(_run_per_profile(tasks, jobs=jobs))
+    return results
 
-    if staging:
-        print(f'Simulated data removal of {profile_path}/chrome/zen-explorer-themes/{theme_id}')
-    else:
-        try:
-            shutil.rmtree(f'{profile_path}/chrome/zen-explorer-themes/{theme_id}')
-        except FileNotFoundError:
-            pass
+def _run_per_profile(tasks: dict, jobs=None) -> dict:
+    # Runs {Profile: callable} on a thread pool, returns {profile folder: the task's result or its exception}
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {zen_profile.folder: executor.submit(task) for zen_profile, task in tasks.items()}
+        for folder, future in futures.items():
+            results[folder] = future.exception() or future.result()
 
-    del data[theme_id]
+    return results
 
-    if staging:
-        print('Simulated data update')
-    else:
-        with open(f'{profile_path}/chrome/zen-explorer.json', 'w+') as f:
-            # noinspection PyTypeChecker
-            json.dump(data, f, indent=4)
+def uninstall_themes(profile, theme_ids, staging=False, progress=None) -> InstallPlan:
+    # progress(theme_id, done, total) is called before and after every removed theme
+    profile = _profile_exists(profile)
+    with timing.span('installer.uninstall', profile=profile.folder, themes=len(theme_ids)):
+        plan = plan_uninstall(profile, theme_ids)
+        if not staging:
+            execute_plan(plan, progress=progress)
 
-    # We can overwrite userChrome and userContent here
-    if staging:
-        chrome, content = _build_css(data)
-        print('Simulated chrome write')
-        print(chrome)
-        print('\nSimulated content write')
-        print(content)
-    else:
-        _apply_css(profile_path, data)
+    return plan
+
+def uninstall_theme(profile, theme_id, staging=False):
+    return uninstall_themes(profile, [theme_id], staging=staging)
+
+def installed_themes(zen_profiles=None) -> set:
+    # Every theme installed in any of the given profiles, used to limit sparse checkouts
+    if zen_profiles is None:
+        zen_profiles = profiles.get_profiles()
+
+    theme_ids = set()
+    for profile in zen_profiles:
+        profile = _profile_exists(profile)
+        if check_installed(profile):
+            theme_ids.update(_read_manifest(_profile_path(profile)))
+
+    return theme_ids
 
-def get_updates(profile) -> dict:
+def get_updates(profile, theme_ids=None) -> dict:
+    # theme_ids limits the check, e.g. to the themes reported as changed by update_repository
     profile = _profile_exists(profile)
     if not check_installed(profile):
         raise RuntimeError('not installed')
 
-    profile_path = _profile_path(profile)
+    with timing.span('installer.updates', profile=profile.folder):
+        data = _read_manifest(_profile_path(profile))
+        version_index = _repository_data().version_index()
 
-    with open(f'{profile_path}/chrome/zen-explorer.json', 'r') as f:
-        data = json.load(f)
+        updates = {}
+        for theme_id in data:
+            if theme_ids is not None and theme_id not in theme_ids:
+                continue
 
-    updates = {}
-    for theme_id in data:
-        zen_theme: Optional[theme.Theme] = repository.data.get_theme(theme_id)
-        if not zen_theme:
-            continue
+            zen_theme: Optional[theme.Theme] = _repository_data().get_theme(theme_id)
+            if not zen_theme:
+                continue
 
-        if zen_theme.updated_at.timestamp() > data[theme_id].get('updatedAt', 0):
-            updates[theme_id] = zen_theme
+            if _drift(data[theme_id], version_index[theme_id]):
+                updates[theme_id] = zen_theme
 
     return updates
+
+def _drift(installed: dict, available: tuple) -> tuple:
+    version, updated_at, content_hash = available
+    reasons = []
+
+    if version != installed.get('version'):
+        reasons.append('version')
+    if updated_at > installed.get('updatedAt', 0):
+        reasons.append('updatedAt')
+    # Manifests written before hashes were recorded can only be compared by version and time
+    if content_hash and installed.get('hash') and content_hash != installed['hash']:
+        reasons.append('hash')
+
+    return tuple(reasons)
+
+def check_updates_all(zen_profiles=None) -> UpdateReport:
+    # One pass over every profile against the repository's precomputed version index
+    if zen_profiles is None:
+        zen_profiles = profiles.get_profiles()
+
+    version_index = _repository_data().version_index()
+    updates = {}
+    errors = {}
+
+    with timing.span('installer.check_updates', profiles=len(zen_profiles)):
+        _check_profiles(zen_profiles, version_index, updates, errors)
+
+    return UpdateReport(updates, errors, len(zen_profiles))
+
+def _check_profiles(zen_profiles, version_index, updates, errors):
+    # Fills in updates and errors in place
+    for profile in zen_profiles:
+        try:
+            zen_profile = _profile_exists(profile)
+            if not check_installed(zen_profile):
+                continue
+            data = _read_manifest(zen_profile.path)
+        except (OSError, ValueError) as error:
+            errors[getattr(profile, 'folder', profile)] = error
+            continue
+
+        theme_updates = []
+        for theme_id, installed in data.items():
+            if theme_id not in version_index:
+                continue
+
+            reasons = _drift(installed, version_index[theme_id])
+            if reasons:
+                theme_updates.append(ThemeUpdate(
+                    zen_profile, theme_id, installed.get('version'), version_index[theme_id][0], reasons
+                ))
+
+        if theme_updates:
+            updates[zen_profile.folder] = theme_updates
+
+def _subset(source_plan: SourcePlan, theme_updates) -> SourcePlan:
+    # Each profile only installs its own pending themes out of the shared scan
+    theme_ids = [update.theme_id for update in theme_updates]
+    return SourcePlan(
+        source_plan.repository_path,
+        {theme_id: source_plan.sources[theme_id] for theme_id in theme_ids},
+        {theme_id: source_plan.entries[theme_id] for theme_id in theme_ids}
+    )
+
+def apply_updates(report: UpdateReport, jobs=None, staging=False, compare='mtime', method='copy') -> dict:
+    # Installs every pending update in the report, profiles are updated concurrently.
+    # Returns {profile folder: InstallPlan or exception}
+    theme_ids = sorted({update.theme_id for theme_updates in report.updates.values() for update in theme_updates})
+    source_plan = plan_source(theme_ids)
+
+    tasks = {}
+    for theme_updates in report.updates.values():
+        zen_profile = theme_updates[0].profile
+        tasks[zen_profile] = (lambda zen_profile=zen_profile, theme_updates=theme_updates: install_themes(
+            zen_profile, [update.theme_id for update in theme_updates], bypass_install=True,
+            staging=staging, compare=compare, method=method, source_plan=_subset(source_plan, theme_updates)
+        ))
+
+    return _run_per_profile(tasks, jobs=jobs)
+
+
+_manifests = {}
@@ -0,0 +1,76 @@
+from typing import NamedTuple, Optional
+from zen_explorer_core.models.profile import Profile
+
+class SourcePlan(NamedTuple):
+    # The profile independent half of an install, scanned once and shared by every target profile
+    repository_path: str
+    # {theme id: {relative path: (size, mtime_ns)}}
+    sources: dict
+    # {theme id: manifest entry}
+    entries: dict
+
+    def to_dict(self) -> dict:
+        return {'repositoryPath': self.repository_path, 'sources': self.sources, 'entries': self.entries}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SourcePlan':
+        return cls(data['repositoryPath'], data['sources'], data['entries'])
+
+class FileOperation(NamedTuple):
+    theme_id: str
+    # 'copy', 'update' or 'delete' for single files, 'remove' for a whole theme folder
+    operation: str
+    path: str
+    size: int
+
+class InstallPlan(NamedTuple):
+    profile: Profile
+    # None for plans that only remove themes
+    source: Optional[SourcePlan]
+    operations: tuple
+    manifest_before: dict
+    manifest_after: dict
+    # {css file: {'added': [...], 'removed': [...]}}, stylesheets gaining or losing an import
+    css_diff: dict
+
+    @property
+    def bytes(self) -> int:
+        # Bytes written for installs, bytes freed for removals
+        return sum(operation.size for operation in self.operations)
+
+    @property
+    def manifest_diff(self) -> dict:
+        before, after = self.manifest_before, self.manifest_after
+        return {
+            'added': [theme_id for theme_id in after if theme_id not in before],
+            'updated': [theme_id for theme_id in after if theme_id in before and after[theme_id] != before[theme_id]],
+            'removed': [theme_id for theme_id in before if theme_id not in after]
+        }
+
+    @property
+    def empty(self) -> bool:
+        return not self.operations and self.manifest_before == self.manifest_after
+
+    def count(self, operation) -> int:
+        return sum(1 for file_operation in self.operations if file_operation.operation == operation)
+
+    def to_dict(self) -> dict:
+        return {
+            'profile': self.profile._asdict(),
+            'source': self.source.to_dict() if self.source else None,
+            'operations': [list(operation) for operation in self.operations],
+            'manifestBefore': self.manifest_before,
+            'manifestAfter': self.manifest_after,
+            'cssDiff': self.css_diff
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'InstallPlan':
+        return cls(
+            Profile(**data['profile']),
+            SourcePlan.from_dict(data['source']) if data.get('source') else None,
+            tuple(FileOperation(*operation) for operation in data['operations']),
+            data['manifestBefore'],
+            data['manifestAfter'],
+            data['cssDiff']
+        )
@@ -0,0 +1,11 @@
+from typing import NamedTuple
+
+class Profile(NamedTuple):
+    id: str
+    name: str
+    root: str
+    path: str
+
+    @property
+    def folder(self) -> str:
+        return f'{self.id}.{self.name}'
@@ -1,85 +1,133 @@
 from enum import Enum
 from datetime import datetime
+from typing import Callable, Optional, Union
 
 class ThemeType(Enum):
     bundle = 0
     chrome = 1
     content = 2
 
-class Theme:
-    def __init__(self, data: dict, install_data: dict):
-        self._raw_data: dict = data
-        self._raw_install_data: dict = install_data
-
-    @property
-    def name(self) -> str:
-        return self._raw_data.get('name')
-
-    @property
-    def author(self) -> str:
-        return self._raw_data.get('author')
+_type_names = {
+    ThemeType.bundle: 'bundle',
+    ThemeType.chrome: 'theme',
+    ThemeType.content: 'page'
+}
+
+def _parse_type(value) -> Optional[ThemeType]:
+    try:
+        return ThemeType(value)
+    except ValueError:
+        return None
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    # convert unix time to datetime
+    if not isinstance(value, (int, float)):
+        return None
+    return datetime.fromtimestamp(value)
+
+def _parse_list(value) -> tuple:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        return value,
+    return tuple(value)
 
-    @property
-    def type(self) -> ThemeType:
-        return ThemeType(self._raw_data.get('type'))
-
-    @property
-    def type_name(self) -> str:
-        if self.type == ThemeType.bundle:
-            return 'bundle'
-        elif self.type == ThemeType.chrome:
-            return 'theme'
-        elif self.type == ThemeType.content:
-            return 'page'
+class Theme:
+    # Parsed once at load and immutable afterwards, install fields are parsed on first use
+    __slots__ = (
+        'name', 'author', 'type', 'type_name', 'description', 'author_url', 'homepage', 'version',
+        'created_at', 'updated_at', 'updated_at_timestamp', 'tags',
+        '_install', '_install_data_loader', '_raw_data', '_raw_install_data'
+    )
+
+    name: str
+    author: str
+    type: Optional[ThemeType]
+    type_name: str
+    description: str
+    author_url: str
+    homepage: str
+    version: str
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    updated_at_timestamp: float
+    tags: tuple
+
+    def __init__(self, data: dict, install_data: Union[dict, Callable[[], dict]], keep_raw=False):
+        set_field = object.__setattr__
+
+        zen_theme_type = _parse_type(data.get('type'))
+        updated_at = data.get('updatedAt')
+
+        set_field(self, 'name', data.get('name'))
+        set_field(self, 'author', data.get('author'))
+        set_field(self, 'type', zen_theme_type)
+        set_field(self, 'type_name', _type_names.get(zen_theme_type, 'unknown'))
+        set_field(self, 'description', data.get('description'))
+        set_field(self, 'author_url', data.get('authorUrl'))
+        set_field(self, 'homepage', data.get('homepage'))
+        set_field(self, 'version', data.get('version'))
+        set_field(self, 'created_at', _parse_timestamp(data.get('createdAt')))
+        set_field(self, 'updated_at', _parse_timestamp(updated_at))
+        set_field(self, 'updated_at_timestamp', float(updated_at) if isinstance(updated_at, (int, float)) else 0.0)
+        set_field(self, 'tags', _parse_list(data.get('tags')))
+        set_field(self, '_raw_data', data if keep_raw else None)
+        set_field(self, '_raw_install_data', None)
+
+        # install_data may be a loader, in which case theme.json is read on first use
+        if callable(install_data):
+            set_field(self, '_install', None)
+            set_field(self, '_install_data_loader', (install_data, keep_raw))
         else:
-            return 'unknown'
+            set_field(self, '_install_data_loader', None)
+            self._parse_install_data(install_data, keep_raw)
 
-    @property
-    def description(self) -> str:
-        return self._raw_data.get('description')
-
-    @property
-    def author_url(self) -> str:
-        return self._raw_data.get('authorUrl')
-
-    @property
-    def homepage(self) -> str:
-        return self._raw_data.get('homepage')
+    def __setattr__(self, key, value):
+        raise AttributeError('Theme is immutable')
 
-    @property
-    def version(self) -> str:
-        return self._raw_data.get('version')
+    def __delattr__(self, key):
+        raise AttributeError('Theme is immutable')
 
-    @property
-    def created_at(self) -> datetime:
-        # convert unix time to datetime
-        return datetime.fromtimestamp(self._raw_data.get('createdAt'))
+    def _parse_install_data(self, install_data: dict, keep_raw):
+        object.__setattr__(self, '_install', (
+            _parse_list(install_data.get('files')),
+            _parse_list(install_data.get('folders')),
+            _parse_list(install_data.get('uclChromeTarget')),
+            _parse_list(install_data.get('uclContentTarget'))
+        ))
+        if keep_raw:
+            object.__setattr__(self, '_raw_install_data', install_data)
 
-    @property
-    def updated_at(self) -> datetime:
-        # convert unix time to datetime
-        return datetime.fromtimestamp(self._raw_data.get('updatedAt'))
+    def _install_fields(self) -> tuple:
+        if self._install is None:
+            loader, keep_raw = self._install_data_loader
+            self._parse_install_data(loader(), keep_raw)
+            object.__setattr__(self, '_install_data_loader', None)
+        return self._install
 
     @property
-    def tags(self) -> list:
-        return self._raw_data.get('tags')
+    def files(self) -> tuple:
+        return self._install_fields()[0]
 
     @property
-    def files(self) -> list:
-        return self._raw_install_data.get('files')
+    def folders(self) -> tuple:
+        return self._install_fields()[1]
 
     @property
-    def folders(self) -> list:
-        return self._raw_install_data.get('folders')
+    def chrome_targets(self) -> tuple:
+        return self._install_fields()[2]
 
     @property
-    def chrome_targets(self) -> list:
-        return self._raw_install_data.get('uclChromeTarget')
+    def content_targets(self) -> tuple:
+        return self._install_fields()[3]
 
     @property
-    def content_targets(self) -> list:
-        return self._raw_install_data.get('uclContentTarget')
+    def raw_data(self) -> Optional[dict]:
+        # Only retained when the theme was created with keep_raw=True
+        return self._raw_data
 
     @property
-    def raw_install_data(self) -> dict:
+    def raw_install_data(self) -> Optional[dict]:
+        # Only retained when the theme was created with keep_raw=True
+        self._install_fields()
         return self._raw_install_data
@@ -0,0 +1,21 @@
+from typing import NamedTuple, Optional
+from zen_explorer_core.models.profile import Profile
+
+class ThemeUpdate(NamedTuple):
+    profile: Profile
+    theme_id: str
+    installed_version: Optional[str]
+    available_version: Optional[str]
+    # Any of 'version', 'updatedAt' and 'hash'
+    reasons: tuple
+
+class UpdateReport(NamedTuple):
+    # {profile folder: [ThemeUpdate, ...]}, only profiles with pending updates are listed
+    updates: dict
+    # {profile folder: exception} for profiles that couldn't be checked
+    errors: dict
+    checked: int
+
+    @property
+    def count(self) -> int:
+        return sum(len(theme_updates) for theme_updates in self.updates.values())
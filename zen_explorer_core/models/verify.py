@@ -0,0 +1,25 @@
+from typing import NamedTuple, Optional
+from zen_explorer_core.models.profile import Profile
+
+class ThemeIssues(NamedTuple):
+    # Relative paths inside the theme folder
+    missing: tuple
+    extra: tuple
+    modified: tuple
+
+    @property
+    def count(self) -> int:
+        return len(self.missing) + len(self.extra) + len(self.modified)
+
+class VerifyReport(NamedTuple):
+    # None when the repository clone was verified
+    profile: Optional[Profile]
+    # {theme id: ThemeIssues}, only themes with problems are listed
+    issues: dict
+    # Installed themes that don't match the repository's version, they need an upgrade rather than a repair
+    outdated: tuple
+    checked: int
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
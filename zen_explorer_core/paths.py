@@ -0,0 +1,5 @@
+import os
+import platformdirs
+
+# Kept apart from repository so lightweight modules like the daemon client don't import the whole core
+save_dir = os.environ.get('WORKING_DIR') or platformdirs.user_data_dir('zen-explorer')
@@ -1,7 +1,9 @@
 import os
 import sys
-import traceback
 from pathlib import Path
+from typing import Optional, Union
+from zen_explorer_core import timing
+from zen_explorer_core.models.profile import Profile
 
 home = str(Path.home())
 
@@ -45,7 +47,7 @@ def _get_flatpak_path():
 
     return path
 
-def _get_paths():
+def _find_paths():
     os_name = sys.platform
 
     if os_name == 'darwin':
@@ -64,35 +66,84 @@ def _get_paths():
 
     return paths
 
-def get_profile_path(profile):
-    paths = _get_paths()
+def _get_paths():
+    global _paths
+
+    # Profile roots don't move while we're running, so only probe for them once
+    if _paths is None:
+        _paths = _find_paths()
+
+    return _paths
+
+def _scan_profiles(paths) -> list:
+    zen_profiles = []
+
     for path in paths:
-        if os.path.isdir(f'{path}/{profile}'):
-            return f'{path}/{profile}'
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_dir():
+                    continue
 
-    raise NotADirectoryError('invalid profile')
+                profile_id, separator, profile_name = entry.name.partition('.')
+                if not separator:
+                    # Not a profile, skip it
+                    continue
 
-def get_profiles():
-    paths = _get_paths()
-    print(f'\nChecking for profiles in {paths}')
-    print(f'path content: {[path for path in paths]}')
-    profiles = []
+                zen_profiles.append(Profile(profile_id, profile_name, path, entry.path))
+
+    return zen_profiles
+
+def _root_mtimes(paths) -> list:
+    mtimes = []
     for path in paths:
-        profiles.extend(os.listdir(path))
-
-        for profile in profiles:
-            print(f'\nfound possible profile: {profile}')
-            # check if profile is a path
-            if not os.path.isdir(f'{path}/{profile}') or profile.startswith('.'):
-                print(f'removing invalid profile: {profile}')
-                profiles.remove(profile)
-            else:
-                try: 
-                    profile_id, profile_name = profile.split('.', 1)
-                    print(f'adding valid profile: {profile}')
-                except ValueError:
-                    print(f'There seem to have been a non-profile file or folder inside the profiles directory. Skipping this profile: {profile}.')
-                    profiles.remove(profile)
-                            
-
-    return profiles
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            mtimes.append(None)
+
+    return mtimes
+
+def _get_index(refresh=False) -> dict:
+    global _index, _paths
+
+    if refresh:
+        _paths = None
+
+    paths = _get_paths()
+    mtimes = _root_mtimes(paths)
+
+    # Creating or removing a profile folder bumps its root's mtime, which invalidates the index
+    if refresh or not _index or _index['mtimes'] != mtimes:
+        with timing.span('profiles.scan', roots=len(paths)) as scan_span:
+            zen_profiles = _scan_profiles(paths)
+            scan_span.add(files=len(zen_profiles))
+        lookup = {}
+        for zen_profile in zen_profiles:
+            lookup.setdefault(zen_profile.folder, zen_profile)
+        for zen_profile in zen_profiles:
+            lookup.setdefault(zen_profile.id, zen_profile)
+
+        _index = {'mtimes': mtimes, 'profiles': zen_profiles, 'lookup': lookup}
+
+    return _index
+
+def get_profiles(refresh=False) -> list:
+    return _get_index(refresh=refresh)['profiles']
+
+def find_profile(profile: Union[str, Profile]) -> Optional[Profile]:
+    # Resolved profiles are passed through as-is, so callers can resolve once and reuse the record
+    if isinstance(profile, Profile):
+        return profile
+
+    return _get_index()['lookup'].get(profile)
+
+def get_profile_path(profile: Union[str, Profile]) -> str:
+    zen_profile = find_profile(profile)
+    if not zen_profile:
+        raise NotADirectoryError('invalid profile')
+
+    return zen_profile.path
+
+
+_paths: Optional[list] = None
+_index: Optional[dict] = None
@@ -1,36 +1,130 @@
 import os
 import json
 import shutil
-import platformdirs
+import subprocess
+from collections.abc import Mapping
 from typing import Optional
+from zen_explorer_core import catalog, hashes, search, timing
 from zen_explorer_core.models import theme
+from zen_explorer_core.paths import save_dir
 
-save_dir = os.environ.get('WORKING_DIR') or platformdirs.user_data_dir('zen-explorer')
+class _ThemeIndex(Mapping):
+    # Read-only view over the catalog that builds themes on access
+    def __init__(self, repository_data):
+        self._repository_data = repository_data
+
+    def __getitem__(self, zen_theme):
+        zen_theme_data = self._repository_data.get_theme(zen_theme)
+        if not zen_theme_data:
+            raise KeyError(zen_theme)
+        return zen_theme_data
+
+    def __iter__(self):
+        return iter(self._repository_data.raw_data)
+
+    def __len__(self):
+        return len(self._repository_data.raw_data)
+
+    def __contains__(self, zen_theme):
+        return zen_theme in self._repository_data.raw_data
 
 class RepositoryData:
-    def __init__(self, path, data):
+    def __init__(self, path, data, install_data: Optional[dict] = None, hashes: Optional[dict] = None,
+                 files: Optional[dict] = None):
         self._path = path
         self._raw_data = data
         self._themes = {}
-
-        for zen_theme in self._raw_data:
-            if not os.path.isfile(f'{self._path}/themes/{zen_theme}/theme.json'):
-                continue
-
-            with open(f'{self._path}/themes/{zen_theme}/theme.json') as f:
-                install_data = json.load(f)
-            self._themes[zen_theme] = theme.Theme(self._raw_data[zen_theme], install_data)
+        self._install_data = install_data or {}
+        self._hashes = hashes or {}
+        # Filled from the catalog's per-theme sidecar files on first use
+        self._files = files or {}
+        self._version_index: Optional[dict] = None
+        self._index = _ThemeIndex(self)
+        self._search_index: Optional[search.SearchIndex] = None
 
     @property
     def path(self):
         return self._path
 
+    @property
+    def raw_data(self):
+        return self._raw_data
+
     @property
     def themes(self):
-        return self._themes
+        return self._index
+
+    def _load_install_data(self, zen_theme) -> dict:
+        # Theme keeps the parsed fields, so the raw dict isn't retained here once it's handed over
+        install_data = self._install_data.pop(zen_theme, None)
+        if install_data is not None:
+            return install_data
+
+        try:
+            with open(f'{self._path}/themes/{zen_theme}/theme.json') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f'theme.json not found for {zen_theme}')
 
     def get_theme(self, zen_theme) -> Optional[theme.Theme]:
-        return self._themes.get(zen_theme)
+        if zen_theme in self._themes:
+            return self._themes[zen_theme]
+
+        if zen_theme not in self._raw_data:
+            return None
+
+        # theme.json is only read once an install field is accessed
+        zen_theme_data = theme.Theme(self._raw_data[zen_theme], lambda: self._load_install_data(zen_theme))
+        self._themes[zen_theme] = zen_theme_data
+        return zen_theme_data
+
+    def content_hash(self, zen_theme) -> Optional[str]:
+        # Only known when the catalog was compiled by update_repository
+        return self._hashes.get(zen_theme)
+
+    def file_hashes(self, zen_theme) -> Optional[dict]:
+        # {relative path: [size, sha256]} as of the last catalog build, None when unknown
+        if zen_theme not in self._files:
+            self._files[zen_theme] = catalog.read_files(catalog_path(), zen_theme, self._hashes.get(zen_theme))
+
+        return self._files[zen_theme]
+
+    def version_index(self) -> dict:
+        # {theme id: (version, updatedAt, content hash)}, built from themes.json without touching theme.json
+        if self._version_index is None:
+            self._version_index = {
+                zen_theme: (
+                    self._raw_data[zen_theme].get('version'),
+                    self._raw_data[zen_theme].get('updatedAt') or 0,
+                    self._hashes.get(zen_theme)
+                )
+                for zen_theme in self._raw_data
+            }
+
+        return self._version_index
+
+    def search_index(self, rebuild=False) -> search.SearchIndex:
+        if self._search_index and not rebuild:
+            return self._search_index
+
+        # The index is persisted per catalog version, so it's only rebuilt after the catalog changes
+        key = catalog.catalog_key(self._path)
+        if not rebuild:
+            self._search_index = search.SearchIndex.load(search_index_path(), key)
+
+        if not self._search_index:
+            with timing.span('search.build', themes=len(self._raw_data)):
+                self._search_index = search.SearchIndex.build(self._raw_data, key=key)
+            try:
+                self._search_index.save(search_index_path())
+            except OSError:
+                pass
+
+        return self._search_index
+
+    def search(self, query, limit=None) -> list:
+        # Returns theme ids, best match first
+        return self.search_index().search(query, limit=limit)
 
 def repository_path():
     if not os.path.isdir(f'{save_dir}/repository'):
@@ -38,33 +132,238 @@ def repository_path():
 
     return f'{save_dir}/repository'
 
-def update_repository(repo: str = 'greeeen-dev/zen-custom-theme-store'):
-    global data
+def revision() -> Optional[str]:
+    # The commit a git clone is at, or the themes.json checksum of a mirror download
+    path = repository_path()
+    head = catalog.git_head(path)
+    if head:
+        return head
 
-    if os.path.isdir(save_dir + '/repository'):
-        code = os.system(f'cd "{save_dir}/repository" && git pull --quiet')
+    try:
+        # Written by sources.HttpMirrorSource
+        with open(f'{path}/.mirror.json') as f:
+            return json.load(f).get('checksums', {}).get('themesJson')
+    except (FileNotFoundError, ValueError):
+        return None
+
+def catalog_path():
+    return f'{save_dir}/catalog.json'
+
+def search_index_path():
+    return f'{save_dir}/search-index.json'
+
+def hash_cache_path():
+    return f'{save_dir}/hashes.json'
+
+def get_hash_cache() -> hashes.HashCache:
+    global _hash_cache
+
+    if _hash_cache is None:
+        _hash_cache = hashes.HashCache(hash_cache_path())
+
+    return _hash_cache
+
+def _load_data() -> Optional[RepositoryData]:
+    path = f'{save_dir}/repository'
+
+    # Prefer the compiled snapshot, it replaces one theme.json read per theme
+    with timing.span('catalog.load'):
+        snapshot = catalog.load_catalog(path, catalog_path())
+    if snapshot:
+        return RepositoryData(path, *snapshot)
+
+    if not os.path.isfile(f'{path}/themes.json'):
+        return None
+
+    with timing.span('repository.load', source='themes.json'):
+        with open(f'{path}/themes.json') as f:
+            themes = json.load(f)
+
+    return RepositoryData(path, themes)
+
+def get_repository(refresh=False) -> Optional[RepositoryData]:
+    global _data, _data_loaded
+
+    if refresh or not _data_loaded:
+        _data = _load_data()
+        _data_loaded = True
+
+    return _data
+
+def _repository_url(repo) -> str:
+    # Owner/name pairs point at GitHub, anything else is passed to git as-is (URLs and local paths)
+    if '://' in repo or repo.startswith('git@') or os.path.exists(repo):
+        return repo
+
+    return f'https://github.com/{repo}'
+
+def _git(*args, cwd=None) -> str:
+    result = subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'failed to update: {result.stderr.strip()}')
+
+    return result.stdout
+
+def _clone_args(repo, path, shallow=True, sparse_themes=None) -> list:
+    args = ['clone', '--quiet']
+    if shallow:
+        args += ['--depth', '1']
+    if sparse_themes is not None:
+        # Blobs outside the sparse checkout are never downloaded
+        args += ['--filter=blob:none', '--sparse']
+
+    return args + [_repository_url(repo), path]
+
+def _sparse_args(sparse_themes) -> list:
+    return ['sparse-checkout', 'set', *[f'themes/{zen_theme}' for zen_theme in sparse_themes]]
+
+def _is_sparse(path) -> bool:
+    # git sets core.sparseCheckout while a sparse checkout is active and clears it on disable,
+    # newer versions keep it in the per-worktree config
+    for config in ('config', 'config.worktree'):
+        try:
+            with open(f'{path}/.git/{config}') as f:
+                if any(line.replace(' ', '').strip().lower() == 'sparsecheckout=true' for line in f):
+                    return True
+        except FileNotFoundError:
+            pass
+
+    return False
+
+def _pull_args(path) -> list:
+    # Shallow clones are moved to the new tip directly, a merge would see unrelated histories
+    if os.path.isfile(f'{path}/.git/shallow'):
+        return [['fetch', '--quiet', '--depth', '1'], ['reset', '--quiet', '--hard', 'FETCH_HEAD']]
+
+    return [['pull', '--quiet']]
+
+def _changed_themes(diff: str, old_themes: Optional[dict], new_themes: dict) -> set:
+    changed = set()
+    for file in diff.splitlines():
+        parts = file.split('/')
+        if len(parts) > 2 and parts[0] == 'themes':
+            changed.add(parts[1])
+
+    # Metadata lives in themes.json, so compare entries rather than trusting the file list
+    old_themes = old_themes or {}
+    for zen_theme in set(old_themes) | set(new_themes):
+        if old_themes.get(zen_theme) != new_themes.get(zen_theme):
+            changed.add(zen_theme)
+
+    return changed
+
+def _read_themes(path) -> dict:
+    with open(f'{path}/themes.json') as f:
+        return json.load(f)
+
+def _refresh(path, changed: Optional[set] = None, old_head=None):
+    global _data, _data_loaded
+
+    # Reuse install data and hashes from the previous snapshot for every theme that didn't change
+    previous = None
+    if changed is not None:
+        snapshot = catalog.read_snapshot(catalog_path())
+        if snapshot and snapshot['key'].get('head') == old_head:
+            previous = snapshot
+
+    # Changed and removed themes may have lost files, their old entries would stay in the hash cache forever
+    for zen_theme in changed or ():
+        get_hash_cache().forget(f'{path}/themes/{zen_theme}')
+
+    with timing.span('catalog.build', incremental=previous is not None):
+        catalog_data = catalog.build_catalog(
+            path, catalog_path(), previous=previous, changed=changed, hash_cache=get_hash_cache()
+        )
+        get_hash_cache().save()
+    _data = RepositoryData(path, *catalog_data)
+    _data.search_index(rebuild=True)
+    _data_loaded = True
+
+def _update_steps(repo, shallow=True, sparse_themes=None):
+    # Yields (label, 'git', args, cwd) or (label, 'call', func, args) and receives each step's result,
+    # so the blocking and asyncio frontends share one update flow
+    path = f'{save_dir}/repository'
+
+    if not os.path.isdir(path):
+        yield 'clone', 'git', _clone_args(repo, path, shallow=shallow, sparse_themes=sparse_themes), None
+        if sparse_themes is not None:
+            yield 'sparse-checkout', 'git', _sparse_args(sparse_themes), path
+
+        yield 'catalog', 'call', _refresh, (path,)
+        return set(_data.raw_data)
+
+    old_head = catalog.git_head(path)
+    old_data = yield 'load', 'call', get_repository, ()
+    old_themes = old_data.raw_data if old_data else None
+
+    # A plain update widens an earlier --sparse clone back to every theme
+    widen = sparse_themes is None and _is_sparse(path)
+    if sparse_themes is not None:
+        yield 'sparse-checkout', 'git', _sparse_args(sparse_themes), path
+    elif widen:
+        yield 'sparse-checkout', 'git', ['sparse-checkout', 'disable'], path
+    for args in _pull_args(path):
+        yield args[0], 'git', args, path
+
+    new_themes = yield 'load', 'call', _read_themes, (path,)
+    new_head = catalog.git_head(path)
+
+    if not old_head:
+        changed = set(new_themes) | set(old_themes or {})
+    elif old_head == new_head:
+        changed = set()
     else:
-        code = os.system(f'git clone https://github.com/{repo} "{save_dir}/repository" --quiet')
-    if code != 0:
-        raise RuntimeError('failed to update')
+        diff = yield 'diff', 'git', ['diff', '--name-only', old_head, new_head], path
+        changed = _changed_themes(diff, old_themes, new_themes)
 
-    with open(f'{save_dir}/repository/themes.json') as f:
-        themes = json.load(f)
+    # Changing the sparse checkout adds or removes theme.json files without a new commit
+    incremental = old_head and sparse_themes is None and not widen
+    yield 'catalog', 'call', _refresh, (path, changed if incremental else None, old_head)
 
-    data = RepositoryData(f'{save_dir}/repository', themes)
+    return changed
+
+def update_repository(repo: str = 'greeeen-dev/zen-custom-theme-store', shallow=True, sparse_themes=None,
+                      source=None) -> set:
+    # Returns the ids of themes that were added, removed or changed by this update.
+    # source is a GitSource or HttpMirrorSource from zen_explorer_core.sources, repo is cloned with git by default.
+    if source is None:
+        from zen_explorer_core import sources
+        source = sources.GitSource(repo, shallow=shallow, sparse_themes=sparse_themes)
+
+    steps = source.steps()
+    result = None
+
+    with timing.span('repository.update', source=type(source).__name__):
+        try:
+            while True:
+                label, kind, target, args = steps.send(result)
+                with timing.span(f'update.{label}'):
+                    result = _git(*target, cwd=args) if kind == 'git' else target(*args)
+        except StopIteration as stop:
+            return stop.value
 
 def delete_repository():
+    global _data, _data_loaded
+
     if os.path.isdir(save_dir + '/repository'):
         shutil.rmtree(f'{save_dir}/repository')
+        catalog.delete_catalog(catalog_path())
+        get_hash_cache().forget(f'{save_dir}/repository')
+        get_hash_cache().save()
+        if os.path.isfile(search_index_path()):
+            os.remove(search_index_path())
+        _data = None
+        _data_loaded = False
     else:
         raise NotADirectoryError('repository not found')
 
+def __getattr__(name):
+    # Keep repository.data working without loading the catalog at import time
+    if name == 'data':
+        return get_repository()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-data: Optional[RepositoryData] = None
-if os.path.isfile(save_dir + '/repository/themes.json'):
-    with open(f'{save_dir}/repository/themes.json') as f:
-        themes = json.load(f)
 
-    data = RepositoryData(f'{save_dir}/repository', themes)
-else:
-    print('themes.json not found in repository directory')
+_data: Optional[RepositoryData] = None
+_data_loaded = False
+_hash_cache: Optional[hashes.HashCache] = None
@@ -0,0 +1,102 @@
+import re
+import json
+import bisect
+from typing import Optional
+from zen_explorer_core import atomic
+
+# Bump this whenever the index layout or scoring changes
+index_version = 1
+
+field_weights = {
+    'name': 4.0,
+    'tags': 3.0,
+    'author': 2.0,
+    'description': 1.0
+}
+
+# Prefix matches count for less than whole-word matches
+prefix_weight = 0.5
+
+_token_pattern = re.compile(r'\w+')
+
+def tokenize(text) -> list:
+    if not text:
+        return []
+
+    return _token_pattern.findall(text.lower())
+
+class SearchIndex:
+    def __init__(self, postings: dict, key=None):
+        # postings maps token => {theme id: score}
+        self._postings = postings
+        self._tokens = sorted(postings)
+        self._key = key
+
+    @property
+    def key(self):
+        return self._key
+
+    @classmethod
+    def build(cls, themes: dict, key=None):
+        postings = {}
+
+        for theme_id, theme_data in themes.items():
+            for field, weight in field_weights.items():
+                value = theme_data.get(field)
+                if isinstance(value, list):
+                    value = ' '.join(str(item) for item in value)
+
+                for token in tokenize(value):
+                    scores = postings.setdefault(token, {})
+                    scores[theme_id] = scores.get(theme_id, 0) + weight
+
+        return cls(postings, key=key)
+
+    @classmethod
+    def load(cls, path, key) -> Optional['SearchIndex']:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get('version') != index_version or data.get('key') != key:
+            return None
+
+        return cls(data['postings'], key=key)
+
+    def save(self, path):
+        atomic.write_json(
+            path, {'version': index_version, 'key': self._key, 'postings': self._postings}, separators=(',', ':')
+        )
+
+    def _match(self, term) -> dict:
+        scores = dict(self._postings.get(term, {}))
+
+        # Tokens are sorted, so every token starting with term sits in one contiguous run
+        position = bisect.bisect_right(self._tokens, term)
+        while position < len(self._tokens) and self._tokens[position].startswith(term):
+            for theme_id, score in self._postings[self._tokens[position]].items():
+                scores[theme_id] = scores.get(theme_id, 0) + score * prefix_weight
+            position += 1
+
+        return scores
+
+    def search(self, query, limit=None) -> list:
+        # Every term has to match, results are ranked by their combined score
+        results = None
+        for term in tokenize(query):
+            scores = self._match(term)
+            if results is None:
+                results = scores
+            else:
+                results = {theme_id: results[theme_id] + score for theme_id, score in scores.items() if theme_id in results}
+
+            if not results:
+                return []
+
+        if not results:
+            return []
+
+        ranked = sorted(results, key=lambda theme_id: (-results[theme_id], theme_id))
+        return ranked[:limit] if limit else ranked
@@ -0,0 +1,198 @@
+import io
+import os
+import json
+import socket
+import threading
+import traceback
+import contextlib
+import socketserver
+from typing import Optional
+from zen_explorer_core import catalog, daemon, installer, profiles, repository, timing
+
+class Watcher:
+    # Polls stat() results rather than using inotify, so it behaves the same on every platform
+    def __init__(self):
+        self._repository: Optional[dict] = None
+        self._manifests: Optional[dict] = None
+
+    @staticmethod
+    def _repository_state() -> Optional[dict]:
+        path = f'{repository.save_dir}/repository'
+        key = catalog.catalog_key(path)
+        if key is None:
+            return None
+
+        # Adding or removing a file bumps its folder's mtime, one stat per theme is enough to spot a changed theme
+        themes = {}
+        with os.scandir(f'{path}/themes') as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    themes[entry.name] = entry.stat().st_mtime_ns
+
+        return {'key': key, 'themes': themes}
+
+    @staticmethod
+    def _manifest_state() -> dict:
+        # get_profiles rescans by itself when a profile root changes
+        try:
+            zen_profiles = profiles.get_profiles()
+        except NotADirectoryError:
+            # No Zen profile folder yet
+            zen_profiles = []
+
+        manifests = {}
+        for zen_profile in zen_profiles:
+            try:
+                manifests[zen_profile.path] = os.stat(f'{zen_profile.path}/chrome/zen-explorer.json').st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+        return manifests
+
+    def sync(self):
+        # Records the current state as seen, used after commands that changed things themselves
+        self._repository = self._repository_state()
+        self._manifests = self._manifest_state()
+
+    def profile_paths(self) -> list:
+        # Profiles with zen-explorer themes installed
+        return list(self._manifests or {})
+
+    def poll(self) -> tuple:
+        # Refreshes whatever changed since the last poll, returns (repository changed, changed profile paths)
+        old_repository, old_manifests = self._repository, self._manifests
+        self.sync()
+
+        repository_changed = old_repository != self._repository
+        if repository_changed:
+            _refresh_repository(old_repository, self._repository)
+
+        changed_profiles = {
+            path for path in self._manifests
+            if old_manifests.get(path) != self._manifests[path]
+        }
+        for path in changed_profiles:
+            installer._read_manifest(path)
+
+        return repository_changed, changed_profiles
+
+def _refresh_repository(old: Optional[dict], new: Optional[dict]):
+    path = f'{repository.save_dir}/repository'
+
+    # Another process may have rebuilt the snapshot already, e.g. a CLI run with --no-daemon
+    if old is None or new is None or catalog.load_catalog(path, repository.catalog_path()):
+        repository.get_repository(refresh=True)
+        return
+
+    old_data = repository.get_repository()
+    old_themes = old_data.raw_data if old_data else None
+    old_head, new_head = old['key']['head'], new['key']['head']
+
+    diff = ''
+    if old_head and new_head and old_head != new_head:
+        diff = repository._git('diff', '--name-only', old_head, new_head, cwd=path)
+    changed = repository._changed_themes(diff, old_themes, repository._read_themes(path))
+    changed.update(
+        zen_theme for zen_theme in set(old['themes']) | set(new['themes'])
+        if old['themes'].get(zen_theme) != new['themes'].get(zen_theme)
+    )
+
+    repository._refresh(path, changed, old_head)
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        message = json.loads(self.rfile.readline())
+
+        if message.get('stop'):
+            response = {'stopped': True}
+            # shutdown() waits for serve_forever, which is busy running this handler
+            threading.Thread(target=self.server.shutdown).start()
+        elif message.get('ping'):
+            response = {'pong': True}
+        else:
+            response = self.server.zen_daemon.run(message)
+
+        self.wfile.write(json.dumps(response).encode())
+
+class Daemon:
+    def __init__(self, handler, interval=2.0):
+        # handler(args) runs one command, everything it prints is sent back to the client
+        self.handler = handler
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._watcher = Watcher()
+        self._stopped = threading.Event()
+
+    def run(self, message) -> dict:
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        error = None
+        timing_state = (timing.enabled, timing.output_format, timing.output)
+
+        # Commands run one at a time, they share the warm state and the process wide cwd and stdout
+        with self._lock, contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            cwd = os.getcwd()
+            try:
+                os.chdir(message.get('cwd') or cwd)
+                if message.get('timings'):
+                    timing.enable(message['timings'], stream=stderr)
+                self.handler(message['args'])
+            except (Exception, SystemExit):
+                error = traceback.format_exc()
+            finally:
+                os.chdir(cwd)
+                if timing_state[0]:
+                    timing.enable(timing_state[1], stream=timing_state[2])
+                else:
+                    timing.disable()
+                self._watcher.sync()
+
+        return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'error': error}
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                try:
+                    self._watcher.poll()
+                except Exception:
+                    traceback.print_exc()
+
+    def serve(self):
+        # Blocks until stop() is called from a client
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('the daemon needs Unix domain sockets')
+        if daemon.running():
+            raise RuntimeError('daemon already running')
+
+        path = daemon.socket_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            # Left behind by a daemon that didn't shut down cleanly
+            os.remove(path)
+
+        # Only the owner may connect, commands run with their permissions
+        old_umask = os.umask(0o177)
+        try:
+            server = socketserver.UnixStreamServer(path, _Handler)
+        finally:
+            os.umask(old_umask)
+        server.zen_daemon = self
+
+        try:
+            # Warm everything up front so the first command is as fast as the rest
+            with self._lock, timing.span('daemon.warm'):
+                repository_data = repository.get_repository()
+                if repository_data:
+                    repository_data.search_index()
+                self._watcher.sync()
+                for profile_path in self._watcher.profile_paths():
+                    installer._read_manifest(profile_path)
+
+            watcher = threading.Thread(target=self._watch, daemon=True)
+            watcher.start()
+            server.serve_forever()
+        finally:
+            self._stopped.set()
+            server.server_close()
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,243 @@
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from zen_explorer_core import atomic, repository, timing
+
+# Mirror layout, as written by export_mirror:
+#   {url}/checksums.json     {"themesJson": "<sha256>", "themes": {"<theme id>": "<sha256 of the archive>"}}
+#   {url}/themes.json        the store's themes.json
+#   {url}/themes/<id>.zip    the theme folder, theme.json at the root of the archive
+_state_name = '.mirror.json'
+# Fixed timestamp so unchanged themes export to byte-identical archives
+_zip_date = (1980, 1, 1, 0, 0, 0)
+
+class GitSource:
+    def __init__(self, repo='greeeen-dev/zen-custom-theme-store', shallow=True, sparse_themes=None):
+        self.repo = repo
+        self.shallow = shallow
+        self.sparse_themes = sparse_themes
+
+    def steps(self):
+        return repository._update_steps(self.repo, shallow=self.shallow, sparse_themes=self.sparse_themes)
+
+class HttpMirrorSource:
+    # Static file mirror, only archives whose checksum changed are downloaded
+    def __init__(self, url, workers=8, timeout=30, session=None):
+        self.url = url.rstrip('/')
+        self.workers = workers
+        self.timeout = timeout
+        self._session = session
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            # One pooled session for every download, so connections are reused
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+            self._session.mount('https://', adapter)
+            self._session.mount('http://', adapter)
+
+        return self._session
+
+    def _get(self, path, headers=None, stream=False):
+        import requests
+
+        try:
+            response = self._get_session().get(
+                f'{self.url}/{path}', headers=headers, timeout=self.timeout, stream=stream
+            )
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException as error:
+            raise RuntimeError(f'failed to update: {error}')
+
+        return response
+
+    def _read_state(self, path) -> dict:
+        try:
+            with open(f'{path}/{_state_name}') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        # Checksums from another mirror say nothing about this one
+        return state if state.get('url') == self.url else {}
+
+    @staticmethod
+    def _write_state(path, state):
+        atomic.write_json(f'{path}/{_state_name}', state, indent=4)
+
+    def _fetch_checksums(self, state) -> Optional[tuple]:
+        # Returns (checksums, etag, last modified), or None when the mirror hasn't changed since the last update
+        headers = {}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('lastModified'):
+            headers['If-Modified-Since'] = state['lastModified']
+
+        response = self._get('checksums.json', headers=headers)
+        if response.status_code == 304:
+            return None
+
+        try:
+            checksums = response.json()
+        except ValueError:
+            raise RuntimeError('failed to update: invalid checksums.json')
+
+        return checksums, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    def _fetch_themes(self, expected) -> bytes:
+        data = self._get('themes.json').content
+        if hashlib.sha256(data).hexdigest() != expected:
+            raise RuntimeError('failed to update: checksum mismatch for themes.json')
+
+        return data
+
+    def _download(self, staging_path, zen_theme, expected):
+        # Streams the archive to disk while hashing it, nothing is extracted unless the checksum matches
+        archive_path = f'{staging_path}/{zen_theme}.zip'
+        digest = hashlib.sha256()
+
+        with self._get(f'themes/{zen_theme}.zip', stream=True) as response, open(archive_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                digest.update(chunk)
+                f.write(chunk)
+
+        if digest.hexdigest() != expected:
+            raise RuntimeError(f'failed to update: checksum mismatch for {zen_theme}')
+
+        timing.add(files=1, bytes=os.path.getsize(archive_path))
+        _extract(archive_path, f'{staging_path}/{zen_theme}')
+        os.remove(archive_path)
+
+    def _apply(self, path, state, fetched) -> set:
+        checksums, etag, last_modified = fetched
+        old_checksums = state.get('checksums', {}).get('themes', {})
+        new_checksums = checksums.get('themes', {})
+
+        themes_data = self._fetch_themes(checksums.get('themesJson'))
+        try:
+            new_themes = json.loads(themes_data)
+        except ValueError:
+            raise RuntimeError('failed to update: invalid themes.json')
+        try:
+            old_themes = repository._read_themes(path)
+        except (FileNotFoundError, ValueError):
+            old_themes = None
+
+        changed = {zen_theme for zen_theme in new_checksums if new_checksums[zen_theme] != old_checksums.get(zen_theme)}
+        removed = {zen_theme for zen_theme in old_checksums if zen_theme not in new_checksums}
+
+        # Download and verify everything first, the live tree is only touched once every archive checked out
+        staging_path = f'{path}/.download'
+        shutil.rmtree(staging_path, ignore_errors=True)
+        os.makedirs(staging_path)
+        try:
+            with timing.span('mirror.download', themes=len(changed)):
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    futures = [
+                        executor.submit(self._download, staging_path, zen_theme, new_checksums[zen_theme])
+                        for zen_theme in sorted(changed)
+                    ]
+                    for future in futures:
+                        future.result()
+
+            os.makedirs(f'{path}/themes', exist_ok=True)
+            for zen_theme in changed | removed:
+                repository.get_hash_cache().forget(f'{path}/themes/{zen_theme}')
+                _replace_dir(f'{path}/themes/{zen_theme}', f'{staging_path}/{zen_theme}' if zen_theme in changed else None)
+        finally:
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+        atomic.write(f'{path}/themes.json', themes_data)
+
+        self._write_state(path, {'url': self.url, 'etag': etag, 'lastModified': last_modified, 'checksums': checksums})
+        # Archives only cover theme folders, metadata edits show up in themes.json alone
+        return changed | removed | repository._changed_themes('', old_themes, new_themes)
+
+    def steps(self):
+        # Same (label, 'call', func, args) protocol as the git steps, so both update_repository frontends work
+        path = f'{repository.save_dir}/repository'
+        if os.path.isdir(f'{path}/.git'):
+            raise RuntimeError('repository is a git clone, delete it before switching to a mirror')
+        os.makedirs(path, exist_ok=True)
+
+        state = yield 'load', 'call', self._read_state, (path,)
+        if not os.path.isfile(f'{path}/themes.json'):
+            state = {}
+
+        fetched = yield 'fetch', 'call', self._fetch_checksums, (state,)
+        if fetched is None:
+            return set()
+
+        changed = yield 'download', 'call', self._apply, (path, state, fetched)
+
+        # A first download has no snapshot to build on
+        incremental = bool(state)
+        yield 'catalog', 'call', repository._refresh, (path, changed if incremental else None, None)
+
+        return changed
+
+def _extract(archive_path, destination):
+    with zipfile.ZipFile(archive_path) as archive:
+        for name in archive.namelist():
+            # Refuse entries that would land outside the theme folder
+            if name.startswith('/') or '..' in name.replace('\\', '/').split('/'):
+                raise RuntimeError(f'failed to update: unsafe path in archive: {name}')
+        archive.extractall(destination)
+
+def _replace_dir(target, replacement: Optional[str]):
+    # Swaps in the new folder before deleting the old one, so a theme is never half-written
+    trash = f'{target}.old'
+    shutil.rmtree(trash, ignore_errors=True)
+    if os.path.isdir(target):
+        os.replace(target, trash)
+    if replacement:
+        os.replace(replacement, target)
+    shutil.rmtree(trash, ignore_errors=True)
+
+def _archive(theme_path, archive_path):
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for dirpath, dirnames, filenames in os.walk(theme_path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_path = os.path.join(dirpath, filename)
+                info = zipfile.ZipInfo(os.path.relpath(file_path, theme_path).replace(os.sep, '/'), _zip_date)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                with open(file_path, 'rb') as f:
+                    archive.writestr(info, f.read())
+
+def export_mirror(output, path=None) -> dict:
+    # Writes the mirror layout for a repository checkout (the local clone by default), returns the checksums
+    path = path or repository.repository_path()
+    os.makedirs(f'{output}/themes', exist_ok=True)
+
+    with open(f'{path}/themes.json', 'rb') as f:
+        themes_data = f.read()
+    themes = json.loads(themes_data)
+
+    checksums = {'themesJson': hashlib.sha256(themes_data).hexdigest(), 'themes': {}}
+    for zen_theme in themes:
+        if not os.path.isdir(f'{path}/themes/{zen_theme}'):
+            continue
+
+        archive_path = f'{output}/themes/{zen_theme}.zip'
+        _archive(f'{path}/themes/{zen_theme}', archive_path)
+        with open(archive_path, 'rb') as f:
+            checksums['themes'][zen_theme] = hashlib.sha256(f.read()).hexdigest()
+
+    with open(f'{output}/themes.json', 'wb') as f:
+        f.write(themes_data)
+    # Written last, clients treat it as the mirror's revision
+    with open(f'{output}/checksums.json', 'w') as f:
+        # noinspection PyTypeChecker
+        json.dump(checksums, f, indent=4)
+
+    return checksums
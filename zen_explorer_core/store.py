@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import threading
+from zen_explorer_core import repository, timing
+
+# Held while linking objects and while collecting, so a fresh object is never collected before it's linked
+_lock = threading.RLock()
+
+def store_path() -> str:
+    return f'{repository.save_dir}/store'
+
+def object_path(digest) -> str:
+    return f'{store_path()}/objects/{digest[:2]}/{digest[2:]}'
+
+def add(path) -> str:
+    # Returns the object's digest, every file version is stored once no matter how many themes ship it
+    digest = repository.get_hash_cache().digest(path)
+    target = object_path(digest)
+
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.tmp-')
+        os.close(fd)
+        try:
+            shutil.copy2(path, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    return digest
+
+def transfer(source, destination):
+    # Installs source as a hardlink to its object, or as a copy when the profile is on another filesystem
+    with _lock:
+        target = object_path(add(source))
+        try:
+            os.link(target, destination)
+        except OSError:
+            shutil.copy2(target, destination)
+
+def collect() -> tuple:
+    # Objects linked from nowhere but the store (st_nlink == 1) aren't installed in any profile anymore.
+    # Returns (removed objects, freed bytes).
+    removed = 0
+    freed = 0
+
+    with _lock, timing.span('store.collect'):
+        try:
+            prefixes = os.scandir(f'{store_path()}/objects')
+        except FileNotFoundError:
+            return 0, 0
+
+        with prefixes:
+            for prefix in prefixes:
+                if not prefix.is_dir():
+                    continue
+
+                with os.scandir(prefix.path) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            # Still being written
+                            continue
+
+                        file_stat = entry.stat()
+                        if file_stat.st_nlink > 1:
+                            continue
+
+                        os.remove(entry.path)
+                        removed += 1
+                        freed += file_stat.st_size
+
+                try:
+                    os.rmdir(prefix.path)
+                except OSError:
+                    # Not empty
+                    pass
+
+        timing.add(files=removed, bytes=freed)
+
+    return removed, freed
+
+def in_use() -> bool:
+    return os.path.isdir(f'{store_path()}/objects')
@@ -0,0 +1,170 @@
+import os
+import sys
+import shutil
+import hashlib
+
+# Linux FICLONE ioctl, lets copy-on-write filesystems (btrfs, xfs) share extents
+_FICLONE = 0x40049409
+
+def file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def combine_hashes(file_hashes: dict) -> str:
+    # Content hash of a whole tree from {relative path: file hash}, covers both file names and file contents
+    digest = hashlib.sha256()
+    for path in sorted(file_hashes):
+        digest.update(f'{path}\0{file_hashes[path]}\n'.encode())
+
+    return digest.hexdigest()
+
+def _relative(path, root) -> str:
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+def _walk(root, folder, entries):
+    for dirpath, _, filenames in os.walk(f'{root}/{folder}' if folder else root):
+        for filename in filenames:
+            file_stat = os.stat(os.path.join(dirpath, filename))
+            entries[_relative(os.path.join(dirpath, filename), root)] = (file_stat.st_size, file_stat.st_mtime_ns)
+
+def scan_source(root, files, folders) -> dict:
+    # Maps relative path to (size, mtime_ns) for everything a theme installs
+    entries = {}
+
+    for file in files or []:
+        file_stat = os.stat(f'{root}/{file}')
+        entries[file] = (file_stat.st_size, file_stat.st_mtime_ns)
+
+    for folder in folders or []:
+        if not os.path.isdir(f'{root}/{folder}'):
+            raise FileNotFoundError(f'folder not found: {root}/{folder}')
+        _walk(root, folder, entries)
+
+    return entries
+
+def scan_destination(root) -> dict:
+    entries = {}
+    if os.path.isdir(root):
+        _walk(root, None, entries)
+
+    return entries
+
+def _changed(source_root, destination_root, path, source_entry, destination_entry, compare) -> bool:
+    if source_entry[0] != destination_entry[0]:
+        return True
+    if compare == 'size':
+        return False
+    if compare == 'hash':
+        return file_hash(f'{source_root}/{path}') != file_hash(f'{destination_root}/{path}')
+
+    return source_entry[1] != destination_entry[1]
+
+def diff_tree(source_root, destination_root, source: dict, destination: dict, compare='mtime') -> list:
+    if compare not in ('size', 'mtime', 'hash'):
+        raise ValueError(f'invalid compare mode: {compare}')
+
+    operations = []
+    for path in source:
+        if path not in destination:
+            operations.append(('copy', path))
+        elif _changed(source_root, destination_root, path, source[path], destination[path], compare):
+            operations.append(('update', path))
+
+    for path in destination:
+        if path not in source:
+            operations.append(('delete', path))
+
+    return operations
+
+def diff_files(old_files: dict, new_files: dict) -> list:
+    # Same result as diff_tree, but from recorded {relative path: [size, sha256]} so neither tree is walked
+    operations = []
+    for path in new_files:
+        if path not in old_files:
+            operations.append(('copy', path))
+        elif old_files[path][1] != new_files[path][1]:
+            operations.append(('update', path))
+
+    for path in old_files:
+        if path not in new_files:
+            operations.append(('delete', path))
+
+    return operations
+
+def _reflink(source, destination):
+    if not sys.platform.startswith('linux'):
+        raise OSError('reflinks are not supported on this platform')
+
+    import fcntl
+
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+        fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+    shutil.copystat(source, destination)
+
+def _transfer(source, destination, method):
+    if method == 'link':
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            # Different filesystem or no hardlink support, copy instead
+            pass
+    elif method == 'reflink':
+        try:
+            _reflink(source, destination)
+            return
+        except OSError:
+            if os.path.exists(destination):
+                os.remove(destination)
+
+    shutil.copy2(source, destination)
+
+def _prune_empty_dirs(root, path):
+    parent = os.path.dirname(f'{root}/{path}')
+    while os.path.normpath(parent) != os.path.normpath(root):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            # Not empty
+            return
+        parent = os.path.dirname(parent)
+
+def _apply_operation(source_root, destination_root, operation, path, method, transfer=None):
+    destination = f'{destination_root}/{path}'
+
+    if operation == 'delete':
+        try:
+            os.remove(destination)
+        except FileNotFoundError:
+            pass
+        _prune_empty_dirs(destination_root, path)
+        return
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    # Unlink first so we never write through a hardlink into the repository clone
+    if operation == 'update':
+        try:
+            os.remove(destination)
+        except FileNotFoundError:
+            # Planned from the manifest and deleted by hand since
+            pass
+    if transfer:
+        transfer(f'{source_root}/{path}', destination)
+    else:
+        _transfer(f'{source_root}/{path}', destination, method)
+
+def apply_operations(source_root, destination_root, operations, method='copy', progress=None, transfer=None):
+    # progress(done, total) is called after every operation, raising from it stops the sync.
+    # transfer(source, destination) replaces the built-in methods, e.g. to install from the shared store.
+    if not transfer and method not in ('copy', 'link', 'reflink'):
+        raise ValueError(f'invalid method: {method}')
+
+    for done, (operation, path) in enumerate(operations, 1):
+        _apply_operation(source_root, destination_root, operation, path, method, transfer=transfer)
+        if progress:
+            progress(done, len(operations))
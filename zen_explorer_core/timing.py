@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# ZEN_EXPLORER_TIMINGS=1 prints a per-phase breakdown to stderr, ZEN_EXPLORER_TIMINGS=json prints JSON lines
+_mode = os.environ.get('ZEN_EXPLORER_TIMINGS', '').lower()
+enabled = _mode not in ('', '0', 'false', 'off')
+output_format = 'json' if _mode == 'json' else 'text'
+output = sys.stderr
+
+_local = threading.local()
+_lock = threading.Lock()
+
+def _stack() -> list:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    return stack
+
+class Span:
+    __slots__ = ('name', 'fields', 'parent', 'depth', 'start', 'duration', 'files', 'bytes', 'children')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.parent = None
+        self.depth = 0
+        self.start = 0.0
+        self.duration = 0.0
+        self.files = 0
+        self.bytes = 0
+        self.children = []
+
+    def add(self, files=0, bytes=0):
+        self.files += files
+        self.bytes += bytes
+
+    def __enter__(self):
+        stack = _stack()
+        if stack:
+            self.parent = stack[-1]
+            self.depth = self.parent.depth + 1
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self.start
+        _stack().pop()
+
+        # Parents include the files and bytes of everything below them
+        if self.parent:
+            self.parent.children.append(self)
+            self.parent.add(self.files, self.bytes)
+
+        if output_format == 'json':
+            _write(json.dumps(_record(self, exc_type)))
+        elif not self.parent:
+            _write('\n'.join(_format_tree(self)))
+
+        return False
+
+class _NullSpan:
+    # Returned while timings are off, so instrumented code pays for one function call and nothing else
+    __slots__ = ()
+
+    def add(self, files=0, bytes=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+_null_span = _NullSpan()
+
+def span(name, **fields):
+    if not enabled:
+        return _null_span
+
+    return Span(name, fields)
+
+def add(files=0, bytes=0):
+    # Counts towards the innermost open span on this thread
+    if not enabled:
+        return
+
+    stack = _stack()
+    if stack:
+        stack[-1].add(files, bytes)
+
+def enable(format='text', stream=None):
+    global enabled, output_format, output
+
+    if format not in ('text', 'json'):
+        raise ValueError(f'invalid timing format: {format}')
+
+    enabled = True
+    output_format = format
+    output = stream or sys.stderr
+
+def disable():
+    global enabled
+    enabled = False
+
+def _record(zen_span: Span, exc_type=None) -> dict:
+    record = {
+        'span': zen_span.name,
+        'parent': zen_span.parent.name if zen_span.parent else None,
+        'depth': zen_span.depth,
+        'ms': round(zen_span.duration * 1000, 3),
+        'files': zen_span.files,
+        'bytes': zen_span.bytes,
+        'thread': threading.current_thread().name
+    }
+    if exc_type:
+        record['error'] = exc_type.__name__
+    record.update(zen_span.fields)
+
+    return record
+
+def format_size(size) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+    return f'{size:.1f} GiB'
+
+def _format_tree(zen_span: Span, depth=0) -> list:
+    label = zen_span.name
+    if zen_span.fields:
+        label += ' [' + ', '.join(f'{key}={value}' for key, value in zen_span.fields.items()) + ']'
+    if depth == 0 and threading.current_thread() is not threading.main_thread():
+        label += f' ({threading.current_thread().name})'
+
+    line = f'{"  " * depth}{label}: {zen_span.duration * 1000:.2f} ms'
+    if zen_span.files:
+        line += f', {zen_span.files} files'
+    if zen_span.bytes:
+        line += f', {format_size(zen_span.bytes)}'
+
+    lines = [line]
+    for child in zen_span.children:
+        lines.extend(_format_tree(child, depth + 1))
+
+    return lines
+
+def _write(text):
+    with _lock:
+        print(text, file=output, flush=True)
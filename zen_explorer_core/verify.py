@@ -0,0 +1,181 @@
+import os
+from zen_explorer_core import hashes, installer, profiles, repository, sync, timing
+from zen_explorer_core.models.verify import ThemeIssues, VerifyReport
+
+# Catalogs built before file hashes were recorded have nothing to verify against
+_no_hashes = 'no file hashes recorded for the repository, run update_repository first'
+
+def _scan_declared(root, files, folders) -> dict:
+    # Like sync.scan_source, but missing entries are skipped instead of raised, they're reported by _compare
+    entries = {}
+
+    for file in files or []:
+        if os.path.isfile(f'{root}/{file}'):
+            entries[file] = os.path.getsize(f'{root}/{file}')
+
+    for folder in folders or []:
+        if os.path.isdir(f'{root}/{folder}'):
+            for path, entry in sync.scan_source(root, [], [folder]).items():
+                entries[path] = entry[0]
+
+    return entries
+
+def _compare(root, expected: dict, actual: dict, digests: dict) -> ThemeIssues:
+    missing = [path for path in expected if path not in actual]
+    extra = [path for path in actual if path not in expected]
+    modified = [
+        path for path in expected
+        if path in actual and (actual[path] != expected[path][0] or digests.get(f'{root}/{path}') != expected[path][1])
+    ]
+
+    return ThemeIssues(tuple(sorted(missing)), tuple(sorted(extra)), tuple(sorted(modified)))
+
+def _hash_pending(checks: list, jobs=None, cached=True) -> dict:
+    # One thread pool for every file of every theme, files whose size already differs aren't hashed.
+    # Only repository files go through the hash cache, profile copies would only bloat it.
+    paths = []
+    for root, expected, actual in checks:
+        for path in expected:
+            if path in actual and actual[path] == expected[path][0]:
+                paths.append(f'{root}/{path}')
+
+    with timing.span('verify.hash') as hash_span:
+        if cached:
+            digests = repository.get_hash_cache().digests(paths, jobs=jobs)
+            repository.get_hash_cache().save()
+        else:
+            digests = hashes.digests(paths, jobs=jobs)
+        hash_span.add(files=len(paths))
+
+    return digests
+
+def verify_repository(theme_ids=None, jobs=None) -> VerifyReport:
+    # Checks the clone against the file hashes recorded when the catalog was built
+    repository_data = installer._repository_data()
+    if theme_ids is None:
+        theme_ids = list(repository_data.raw_data)
+
+    checks = {}
+    for theme_id in theme_ids:
+        zen_theme = repository_data.get_theme(theme_id)
+        if not zen_theme:
+            raise FileNotFoundError(f'theme not found: {theme_id}')
+
+        root = f'{repository_data.path}/themes/{theme_id}'
+        if not os.path.isdir(root):
+            # Outside a sparse checkout
+            continue
+
+        expected = repository_data.file_hashes(theme_id)
+        if expected is None:
+            raise RuntimeError(_no_hashes)
+
+        checks[theme_id] = (root, expected, _scan_declared(root, zen_theme.files, zen_theme.folders))
+
+    digests = _hash_pending(list(checks.values()), jobs=jobs)
+
+    issues = {}
+    for theme_id, check in checks.items():
+        theme_issues = _compare(*check, digests)
+        if theme_issues.count:
+            issues[theme_id] = theme_issues
+
+    return VerifyReport(None, issues, (), len(checks))
+
+def verify_profile(profile, jobs=None) -> VerifyReport:
+    # Checks installed copies against the files recorded when they were installed
+    profile = installer._profile_exists(profile)
+    if not installer.check_installed(profile):
+        raise RuntimeError('not installed')
+
+    repository_data = installer._repository_data()
+    version_index = repository_data.version_index()
+    data = installer._read_manifest(profile.path)
+
+    checks = {}
+    outdated = []
+    for theme_id, entry in data.items():
+        # Repairs copy from the repository, so only themes installed from its current version are checked,
+        # an older version would otherwise show up as modified
+        if theme_id not in version_index or installer._drift(entry, version_index[theme_id]):
+            outdated.append(theme_id)
+            continue
+
+        # Schema 2 manifests record what was installed, older ones are checked against the repository's files
+        expected = entry.get('files') or repository_data.file_hashes(theme_id)
+        if expected is None:
+            raise RuntimeError(_no_hashes)
+
+        root = f'{profile.path}/chrome/zen-explorer-themes/{theme_id}'
+        actual = {path: entry[0] for path, entry in sync.scan_destination(root).items()}
+        checks[theme_id] = (root, expected, actual)
+
+    digests = _hash_pending(list(checks.values()), jobs=jobs, cached=False)
+
+    issues = {}
+    for theme_id, check in checks.items():
+        theme_issues = _compare(*check, digests)
+        if theme_issues.count:
+            issues[theme_id] = theme_issues
+
+    return VerifyReport(profile, issues, tuple(outdated), len(checks))
+
+def verify_profiles(zen_profiles=None, jobs=None) -> dict:
+    # Returns {profile folder: VerifyReport or exception}, profiles without zen-explorer themes are skipped
+    if zen_profiles is None:
+        zen_profiles = profiles.get_profiles()
+
+    reports = {}
+    for profile in zen_profiles:
+        try:
+            zen_profile = installer._profile_exists(profile)
+            if installer.check_installed(zen_profile):
+                reports[zen_profile.folder] = verify_profile(zen_profile, jobs=jobs)
+        except (OSError, RuntimeError, ValueError) as error:
+            reports[getattr(profile, 'folder', profile)] = error
+
+    return reports
+
+def _repair_repository(report: VerifyReport) -> int:
+    path = repository.repository_path()
+    if not os.path.isdir(f'{path}/.git'):
+        raise RuntimeError('repairing the repository needs a git clone, run update_repository instead')
+
+    restore = []
+    fixed = 0
+    for theme_id, theme_issues in report.issues.items():
+        restore.extend(f'themes/{theme_id}/{file}' for file in theme_issues.missing + theme_issues.modified)
+        for file in theme_issues.extra:
+            os.remove(f'{path}/themes/{theme_id}/{file}')
+        fixed += theme_issues.count
+
+    if restore:
+        repository._git('checkout', 'HEAD', '--', *restore, cwd=path)
+
+    return fixed
+
+def _repair_profile(report: VerifyReport) -> int:
+    repository_path = repository.repository_path()
+    fixed = 0
+
+    for theme_id, theme_issues in report.issues.items():
+        # Only the broken files are copied again
+        operations = [('copy', file) for file in theme_issues.missing]
+        operations += [('update', file) for file in theme_issues.modified]
+        operations += [('delete', file) for file in theme_issues.extra]
+        sync.apply_operations(
+            f'{repository_path}/themes/{theme_id}',
+            f'{report.profile.path}/chrome/zen-explorer-themes/{theme_id}',
+            operations
+        )
+        fixed += len(operations)
+
+    return fixed
+
+def repair(report: VerifyReport) -> int:
+    # Fixes every issue in the report, returns the number of files fixed. Outdated themes are left to upgrades.
+    with timing.span('verify.repair') as repair_span:
+        fixed = _repair_profile(report) if report.profile else _repair_repository(report)
+        repair_span.add(files=fixed)
+
+    return fixed